@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """Example of user-defined Lite Data Objects"""
-__version__ = '3.3.4 2025-05-09'# set_clear()
+__version__ = '3.4.0 2026-10-17'# --streamMinSize option
 
 import sys, time, threading
 timer = time.perf_counter
@@ -199,6 +199,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description=__doc__
         ,formatter_class=argparse.ArgumentDefaultsHelpFormatter
         ,epilog=f'liteScaler version {__version__}, liteserver {liteserver.__version__}')
+    parser.add_argument('-B','--bulkPort', type=int, default=0, help=\
+    'Port for publications, if 0 then they are sent from the serving port.')
     parser.add_argument('-b','--bigImage', action='store_true', help=\
     'Generate big image >64kB.')
     defaultIP = liteserver.ip_address('')
@@ -206,6 +208,8 @@ if __name__ == "__main__":
         choices=liteserver.ip_choices() + ['','localhost'], help=\
 'Network address. Default is the addrees, which is connected to internet')
     n = 1100# to fit liteScaler volume into one chunk
+    parser.add_argument('-M','--sendmmsg', action='store_true', help=\
+    'Send all chunks of published data in one sendmmsg() syscall (Linux only).')
     parser.add_argument('-n','--nCounters', type=int, default=n,
       help=f'Number of counters in each scaler, one transmission is 16K.')
       #default liteAcces accepts 1100 doubles, 9990 int16s
@@ -216,10 +220,24 @@ if __name__ == "__main__":
     help='Start the run')
     parser.add_argument('-s','--scalers', type=int, default=1, help=\
     'Number of devices/scalers.')
+    parser.add_argument('-S','--streamMinSize', type=int, default=0, help=\
+    'Send the buffers of larger numpy values without copying, 0: disabled.')
+    parser.add_argument('-t','--tcpPort', type=int, default=0, help=\
+    'Port for TCP connections, if 0 then only UDP is served.')
+    parser.add_argument('-u','--unixPath', default='', help=\
+    'Path of AF_UNIX socket for local clients.')
     parser.add_argument('-v','--verbose', nargs='*', help='Show more log messages.')
+    parser.add_argument('-w','--workers', type=int, default=0, help=\
+    'Number of worker processes, serving the port (Linux only).')
     pargs = parser.parse_args()
 
     liteserver.Server.Dbg = 0 if pargs.verbose is None else len(pargs.verbose)+1
+    liteserver.Sendmmsg = pargs.sendmmsg
+    liteserver.BulkPort = pargs.bulkPort
+    liteserver.Workers = pargs.workers
+    liteserver.TCPPort = pargs.tcpPort
+    liteserver.UnixPath = pargs.unixPath
+    liteserver.StreamMinSize = pargs.streamMinSize
     devices = [
       Scaler('dev'+str(i+1), bigImage=pargs.bigImage)\
       for i in range(pargs.scalers)]
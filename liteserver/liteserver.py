@@ -2,6 +2,66 @@
 It hosts the Lite Data Objects and responds to info/get/set/subscribe commands.
 
 Transport protocol: UDP with handshaking and re-transmission. 
+Replies are chopped to chunks, prefixed with 4-byte offset, the client 
+acknowledges the reply with b'ACK' and only one reply can be unacknowledged.
+If request contains item 'window':N, then the server switches to sequenced
+mode for this client, until it requests 'window':0: the chunks are prefixed with SeqHeader 
+(sequence number, offset, reply length, chunk size, flags), up to N replies 
+could be in flight and the client acknowledges them with b'ACK' followed by
+AckRange (first and last acknowledged sequence numbers).
+In sequenced mode the request could also contain 'chunkSize': number of 
+bytes or 'mtu', then the chunks will fit into the path MTU and will not be 
+fragmented by IP layer.
+A device can have a multicast group, then subscribe request with item 
+'multicast':True makes the client to receive the publications from the group,
+in sequenced mode. The publication is sent once for all such clients, it 
+includes all parameters, subscribed by them. The clients do not acknowledge 
+the publications, they ask for retransmission of lost chunks, specifying 
+'group' in the retransmit request.
+If a client in sequenced mode requests 'fec':True, then multi-chunk replies 
+are followed by XOR parity chunks, SeqHeader of the parity chunk has
+FlagParity and number of parity chunks in the upper byte of flags, its offset
+field is the parity index j. The parity j covers the chunks, which index 
+modulo number of parity chunks is j, shorter chunk is padded with zeros.
+Multicast publications always have parity chunks, if they are configured.
+If BulkPort is set, then the publications are sent from that port, the 
+clients should send their ACKs and retransmit requests to the address, the 
+publications came from. The requests and replies to them stay on the control
+port, they do not wait behind the publications.
+If Workers is set, then the port is served by that many forked processes,
+bound with SO_REUSEPORT. The devices run in the acquisition process, it 
+streams the published parameters to the workers and executes the get and 
+set requests, forwarded by them, including the setting of server parameters
+AcquisitionServerPars. The code after Server() runs in all 
+processes, Server.worker is None only in the acquisition process. BulkPort
+and UnixPath are not supported with Workers.
+If TCPPort is set, then TCP connections are served on that port as well.
+The requests and replies are CBOR frames, prefixed with 4-byte length, 
+the publications are delivered over the connection, they are not chunked 
+and not acknowledged.
+If subscribe request has item 'shm':True, then the published numpy values, 
+larger than ShmMinSize, are placed into shared memory ring and the 
+publication has item 'shm' instead of 'value': [shared memory name, offset,
+number of bytes, slot, sequence]. For clients on the same host.
+If UnixPath is set, then local clients could send the requests to AF_UNIX 
+datagram socket, bound to that path, from their own bound socket. The 
+replies are chunked with UnixChunkSize, prefixed with offset as for UDP, the
+delivery is reliable, the replies are not acknowledged.
+If subscribe request has item 'lease':seconds or LeaseTime is set, then the
+subscriptions of the UDP client are cancelled when the server did not 
+receive any datagram from the client during the lease. An idle client 
+renews its lease by sending the Keepalive datagram b'KEEP'.
+If get, read or info request has item 'rid' (request identifier, kept when 
+the request is resent), then the duplicates of the request from the same 
+client and pid, received during ReplyCacheTime, are answered with the 
+already encoded reply, the getters are not called again.
+If StreamMinSize is set, then the UDP replies with larger numpy values are 
+not encoded as a whole: the encoded skeleton of the reply is spliced with 
+the buffers of the arrays and the chunks are sliced directly from them. 
+The sending starts without encoding latency and the encoded copy is not 
+made. The writable arrays are copied once, the read-only arrays 
+(flags.writeable is False) are not copied at all, the device should replace
+such value with a new array, it can not modify it.
 
 Binary object encoding protocol: CBOR
 
@@ -15,10 +75,16 @@ Supported commands:
 - read:     reply only with values of readable LDOs, with changed timestamp, 
 - set:      set values of LDOs
 - ACK:      internal, response from a client on server reply
+- retransmit: internal, request from a client to resend the lost chunks, 
+            one chunk: [offset,size] or many: {'chunks':[indexes]}/{'bitmap':bytes}
 - subscribe: server will reply when any of requested readable parameters have changed
 - unsubscribe: cancel all subscriptions.
+- batch:    [command,[[batch of sub-commands]]], the sub-commands are get, set,
+            read or info, possibly for different devices. The reply is the
+            list of their replies, the failed ones are replaced with 
+            'ERR.LS...' messages.
 """
-__version__ = '3.3.8 2026-04-19'# Do not exit if exception in ip_choices. It will be thrown in Windows.
+__version__ = '3.6.1 2026-10-17'# Streaming encoding of large numpy values.
 #TODO: WARN.LS and ERROR.LS messages should be published in server:status
 #TODO: Windows throws  [WinError 10054] An existing connection in line 981, dead client is not detected
 
@@ -27,9 +93,16 @@ timer = time.perf_counter
 import threading
 publish_Lock = threading.Lock()
 ackCount_Lock = threading.Lock()
-send_UDP_Lock = threading.Lock()
 import socket
 import array
+import collections, queue, struct, bisect
+import asyncio
+import os, signal, multiprocessing, pickle
+import atexit
+try:
+    from multiprocessing import shared_memory# python 3.8+
+except ImportError:
+    shared_memory = None
 
 # object encoding, uncomment encoder of your choice: msgpack or ubjson:
 #import ubjson as encoder
@@ -39,7 +112,6 @@ encoderDump = encoder.dumps
 encoderLoad = encoder.loads
 
 import selectors# only for TCP
-Selector = selectors.DefaultSelector()
 LastPID = '?'
 UDP = True# If True then it will use UDP protocol, else - TCP.
 if UDP:
@@ -49,12 +121,60 @@ if UDP:
     #ChunkSleep = 0.001 # works on localhost, 50MB/s, and on shallow network
     #ChunkSleep = 0.0005 # works on localhost, 100MB/s, rare KeyError: 'pid'
     ChunkSleep = 0
+    Pacing = False# Adapt the burst size and the gap between bursts of chunks to the losses of each client, ChunkSleep is not used
+    PacingMaxBurst = 64# Max number of chunks, sent without a pause
+    PacingMaxGap = 0.002# Max pause between bursts
     #SendSleep = 0.001
+    ScatterGather = hasattr(socket.socket, 'sendmsg')# Not available on Windows
+    Sendmmsg = False# Linux only. Send all chunks of a message in one sendmmsg() syscall
     MaxAckCount = 10# Number of attempts to ask for delivery acknowledge
     ItemLostLimit = 2# Number of failed deliveries before considering that the client is dead.
-    AckInterval = 10.# Not used. Interval of acknowledge checking
+    SenderThreads = 4# Threads, sending publications to subscribers, 0: send from publishing thread
+    OutboundQueueSize = 4# Max number of publications, waiting to be sent to a subscriber
+    RequestThreads = 0# Optional threads, handling the requests, if 0 then they are handled in the receive loop
+    RequestQueueSize = 100# Max number of pending requests of a client
+    MaxWindow = 64# Max number of unacknowledged replies to a client in sequenced mode
+    SeqHeader = struct.Struct('>IIIHH')# seq, offset, length, chunkSize, flags
+    AckRange = struct.Struct('>II')# first and last acknowledged seq
+    MTUChunking = False# In sequenced mode the chunks fit into the path MTU, unless client requests its chunkSize
+    DefaultMTU = 1500# If path MTU could not be determined
+    MulticastTTL = 1# Number of router hops for multicast publications
+    MulticastRetain = 16# Number of recent multicast publications, kept for retransmission
+    ParityChunks = 0# Number of parity chunks for multi-chunk replies or 'auto': adapt to the loss rate, it can be overridden by Device.parityChunks
+    MaxParityChunks = 8
+    FlagParity = 1# SeqHeader flags bit of the parity chunk
+    RetainBudget = 100*1024*1024# Max bytes of unacknowledged replies, kept for retransmission
+    RetainTime = 30.# Max time to keep unacknowledged reply
+    AckTimeout = 0.2# Time to wait for acknowledge of a reply before probing the client
+    ServiceInterval = 0.05# Period of the retransmission timer
+    ClientIdleTime = 60.# The state of the client without subscriptions is dropped, when it is idle for this time
+    MaxDatagramSize = 65536# Size of the receive buffer, requests are not truncated
+    BulkPort = 0# If not 0, then publications are sent from this port, it receives their ACKs and retransmit requests
+    BulkSendBuffer = 16*1024*1024# SO_SNDBUF of the bulk port
+    SendBuffer = 4*1024*1024# SO_SNDBUF of the UDP sockets, 0: system default, Linux limits it with net.core.wmem_max
+    ReceiveBuffer = 4*1024*1024# SO_RCVBUF of the UDP sockets, 0: system default, Linux limits it with net.core.rmem_max
+    RxqOvfl = sys.platform.startswith('linux')# Count the datagrams, dropped by kernel on receive, using SO_RXQ_OVFL
+    SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40)
+    UnixPath = ''# If set, then local clients are served on AF_UNIX datagram socket, bound to this path
+    UnixChunkSize = 200000# Max datagram of AF_UNIX socket is limited by its SO_SNDBUF
+    LeaseTime = 0.# Lease of subscriptions, s, 0: only the clients, which request 'lease' in subscribe, have leases
+    Keepalive = b'KEEP'# Datagram, renewing the lease of the client
+    AcquisitionServerPars = ('Reset','run','devsPollingInterval','debug')# With Workers, setting of these server parameters is executed in the acquisition process
+    Workers = 0# Number of worker processes, serving the port with SO_REUSEPORT (Linux), devices run in the acquisition process
 
 defaultServerPort = 9700# Communication port number
+TCPPort = 0# If not 0, then TCP connections are served on this port as well
+FramePrefix = struct.Struct('>I')# length of the TCP frame
+TCPSendTimeout = 10.# Max time to wait until a TCP connection accepts data
+MaxFrameRead = 65536# Max bytes to read from TCP connection at once
+MaxFrameSize = 16*1024*1024# Max size of TCP request frame, the connection with larger frame is closed
+ShmSlots = 4# Number of slots in shared memory ring of a parameter
+ShmMinSize = 65536# Smaller numpy values are delivered in the publication
+ReplyCacheTime = 2.# Time to keep the encoded reply to a request with 'rid', for its duplicates
+ReplyCacheBudget = 16*1024*1024# Max bytes of the cached replies
+CachedCommands = ('get','read','info')# Commands, which replies are cached
+BatchCommands = ('get','set','read','info')# Commands, allowed in the batch
+StreamMinSize = 0# If not 0, then the buffers of larger numpy values are sent over UDP without copying them into the encoded reply
 NSDelimiter = ':'# delimiter in the name field
 #````````````````````````````Helper functions`````````````````````````````````
 def croppedText(obj, limit=300):
@@ -110,22 +230,299 @@ def ip_address(interface = ''):
         pass
     return ipaddr
 
-def accept_TCP(sock, mask):
-    conn, addr = sock.accept()  # Should be ready
-    print('accepted', conn, 'from', addr)
-    conn.setblocking(False)
-    Selector.register(conn, selectors.EVENT_READ, read_TCP)
-
-def read_TCP(conn, mask):
-    print(f'read_TCP: {conn, mask}')
-    data = conn.recv(1024)  # Should be ready
-    if data:
-        print('echoing', repr(data), 'to', conn)
-        conn.send(data)  # Hope it won't block
-    else:
-        print('closing', conn)
-        Selector.unregister(conn)
+def path_mtu(host):
+    """MTU of the route to the host. It is known only on Linux, on other 
+    platforms the DefaultMTU is returned"""
+    IP_MTU_DISCOVER, IP_PMTUDISC_DO, IP_MTU = 10, 2, 14# from linux/in.h
+    if not sys.platform.startswith('linux'):
+        return DefaultMTU
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+        s.connect((host, defaultServerPort))# no packets are sent
+        return s.getsockopt(socket.IPPROTO_IP, IP_MTU)
+    except OSError as e:
+        printw(f'Could not get path MTU to {host}: {e}')
+        return DefaultMTU
+    finally:
+        s.close()
+
+#````````````````````````````TCP transport````````````````````````````````````
+class _TCPServer():
+    """Selector-based TCP server. Requests and replies are CBOR frames, 
+    prefixed with FramePrefix (frame length). The subscriptions are delivered 
+    over persistent connections, the kernel takes care of congestion control
+    and retransmissions, the replies are not chunked or acknowledged."""
+    def __init__(self, hostPort):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if UDP and Workers:
+            # the connections are distributed among the worker processes
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        print(f'starting TCP on port {hostPort}')
+        self.sock.bind(hostPort)
+        self.sock.listen()
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ, self._accept)
+        self.received = {}# {conn: bytearray of incomplete frame}
+        self.peers = {}# {conn: client address}
+        self.bulkSock = None
+
+    def _accept(self, sock):
+        conn, addr = sock.accept()
+        printv(f'TCP connection from {addr}')
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # the selector reads it when it is ready, the sending waits
+        conn.settimeout(TCPSendTimeout)
+        self.received[conn] = bytearray()
+        self.peers[conn] = addr
+        self.selector.register(conn, selectors.EVENT_READ, self._read)
+
+    def _read(self, conn):
+        try:
+            data = conn.recv(MaxFrameRead)
+        except (BlockingIOError, socket.timeout):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close(conn)
+            return
+        buf = self.received[conn]
+        buf += data
+        while len(buf) >= FramePrefix.size:
+            size = FramePrefix.unpack_from(buf)[0]
+            if size > MaxFrameSize:
+                printw(f'TCP frame of {size} bytes from {self.peers[conn]}')
+                self._close(conn)
+                return
+            end = FramePrefix.size + size
+            if len(buf) < end:
+                break
+            frame = bytes(buf[FramePrefix.size:end])
+            del buf[:end]
+            handle_socketData(frame, (conn, self.peers[conn]))
+
+    def _close(self, conn):
+        addr = self.peers.pop(conn)
+        printv(f'TCP connection from {addr} closed')
+        self.selector.unregister(conn)
+        del self.received[conn]
         conn.close()
+        for dev in list(Server.DevDict.values()):
+            if addr in dev.subscribers:
+                dev.unsubscribe(addr)
+        _TCPLocks.pop(conn, None)
+
+    def serve(self):
+        """Serve connections until exit"""
+        while not Device.EventExit.is_set():
+            for key, mask in self.selector.select(timeout=1):
+                try:
+                    key.data(key.fileobj)
+                except Exception as e:
+                    print(f'Exception in the TCP loop: {e}: {traceback.format_exc()}')
+
+    def service_actions(self):
+        return
+
+_TCPLocks = {}
+def _send_TCP(buf, conn):
+    """Send the frame to the connection. Frames from different threads are
+    not interleaved. If the connection is broken, it is shut down, the 
+    selector will close it and cancel its subscriptions."""
+    lock = _TCPLocks.get(conn)
+    if lock is None:
+        lock = _TCPLocks.setdefault(conn, threading.Lock())
+    prefix = FramePrefix.pack(len(buf))
+    with lock:
+        try:
+            if not hasattr(conn, 'sendmsg'):# Windows
+                conn.sendall(prefix + buf)
+                return
+            sent = conn.sendmsg((prefix, buf))
+            if sent < len(prefix):
+                conn.sendall(prefix[sent:])
+                sent = len(prefix)
+            conn.sendall(memoryview(buf)[sent-len(prefix):])
+        except OSError as e:
+            printw(f'TCP connection is broken: {e}')
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+def _send(buf, sock, hostPort, alsoTo=(), parity=None):
+    """Send reply over the transport of the socket"""
+    if sock.type == socket.SOCK_STREAM:
+        _send_TCP(buf, sock)
+    elif UDP and sock is _myUDPServer.unixSock:# AF_UNIX is not on Windows
+        for path in (hostPort, *alsoTo):
+            _send_unix(buf, sock, path)
+    else:
+        _send_UDP(buf, sock, hostPort, alsoTo, parity)
+
+class _KeyedPool():
+    """Pool of threads, executing jobs, submitted with a key. The jobs with 
+    the same key are executed one at a time in order of submission, the 
+    jobs with different keys are executed concurrently. The queue of a key
+    is bounded, if it is full, then the oldest job is dropped and 
+    onDrop(*args) of the dropped job is called."""
+    def __init__(self, name, nThreads, queueSize, onDrop=None):
+        self.queueSize = queueSize
+        self.onDrop = onDrop
+        self.queues = {}# pending jobs of active keys
+        self.ready = queue.Queue()# active keys, which are not being served
+        self.lock = threading.Lock()
+        for i in range(nThreads):
+            thread = threading.Thread(target=self._worker, daemon=True,
+              name=f'{name}{i}')
+            thread.start()
+
+    def submit(self, key, func, *args):
+        """Queue func(*args) for execution. Returns number of dropped jobs"""
+        dropped = []
+        with self.lock:
+            jobs = self.queues.get(key)
+            if jobs is None:
+                jobs = self.queues[key] = collections.deque()
+                self.ready.put(key)
+            while len(jobs) >= self.queueSize:
+                dropped.append(jobs.popleft())
+            jobs.append((func, args))
+        if self.onDrop is not None:
+            for _, droppedArgs in dropped:
+                self.onDrop(*droppedArgs)
+        return len(dropped)
+
+    def _worker(self):
+        while True:
+            key = self.ready.get()
+            with self.lock:
+                func, args = self.queues[key].popleft()
+            try:
+                func(*args)
+            except Exception as e:
+                printe(f'in {threading.current_thread().name}: {e}')
+            # serve other keys before the next job of this key
+            with self.lock:
+                if self.queues[key]:
+                    self.ready.put(key)
+                else:
+                    del self.queues[key]
+
+#````````````````````````````Worker processes`````````````````````````````````
+_WorkerLinks = []# links to the worker processes, in acquisition process
+_AcquisitionLink = None# link to the acquisition process, in worker process
+_Forwarders = None# _KeyedPool of threads, forwarding publications to workers
+
+class _WorkerLink():
+    """Pipes between the acquisition process and a worker process. The 
+    acquisition process streams the fresh parameters of published devices
+    to the worker, the worker forwards get and set requests to the 
+    acquisition process, where the devices run. The worker reports the 
+    devices, which have subscribers, only they are streamed to it."""
+    def __init__(self):
+        self.pubReceiver, self.pubSender = multiprocessing.Pipe(duplex=False)
+        self.requester, self.responder = multiprocessing.Pipe()
+        self.reportReceiver, self.reportSender = multiprocessing.Pipe(
+          duplex=False)
+        self.lock = threading.Lock()
+        self.pid = None
+        self.subscribed = set()# devices with subscribers in the worker
+
+    def close(self, *ends):
+        for end in ends:
+            getattr(self, end).close()
+
+    def forward(self, frame):
+        """Send pickled (devName, pars) to the worker"""
+        try:
+            self.pubSender.send_bytes(frame)
+        except OSError as e:
+            printw(f'Worker {self.pid} is not reachable: {e}')
+
+    def request(self, cmdArgs):
+        """Execute the command in the acquisition process, returns reply data"""
+        with self.lock:
+            self.requester.send(cmdArgs)
+            r = self.requester.recv()
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+def _forward_publication(dev):
+    """Send the parameters, changed since the last publication, to the 
+    workers, which have subscribers of the device. The parameters are 
+    pickled once, they are sent by _Forwarders, the slow worker does not 
+    block the device, its oldest pending publications are dropped"""
+    links = [l for l in _WorkerLinks if dev.name in l.subscribed]
+    lastPublishTime = dev.lastPublishTime
+    dev.lastPublishTime = time.time()
+    if len(links) == 0:
+        return
+    pars = {}
+    for parName, pv in dev.PV.items():
+        if pv.timestamp and pv.timestamp - lastPublishTime >= 0:
+            pars[parName] = pv.value, pv.timestamp
+    if len(pars) == 0:
+        return
+    frame = pickle.dumps((dev.name, pars), pickle.HIGHEST_PROTOCOL)
+    for link in links:
+        dropped = _Forwarders.submit(link, link.forward, frame)
+        if dropped:
+            printv(f'Publication queue of worker {link.pid} is full')
+            Server.Perf['QueueDrops'] += dropped
+
+def _report_subscriptions():
+    """In worker process: report the devices, which have subscribers"""
+    devNames = {name for name,dev in Server.DevDict.items()
+      if len(dev.subscribers) > 0}
+    if devNames != _AcquisitionLink.subscribed:
+        _AcquisitionLink.subscribed = devNames
+        _AcquisitionLink.reportSender.send(devNames)
+
+def _receive_reports(link):
+    """In acquisition process: update the devices, subscribed in worker"""
+    while not Device.EventExit.is_set():
+        try:
+            link.subscribed = link.reportReceiver.recv()
+        except EOFError:
+            return
+
+def _serve_worker_requests(link):
+    """In acquisition process: execute the requests, forwarded by worker"""
+    while not Device.EventExit.is_set():
+        try:
+            cmdArgs = link.responder.recv()
+        except EOFError:
+            printw(f'Worker {link.pid} exited')
+            return
+        try:
+            r = _replyData(cmdArgs)
+        except Exception as e:
+            r = RuntimeError(str(e))
+        link.responder.send(r)
+
+def _receive_publications(link):
+    """In worker process: update device parameters and publish them. The 
+    forwarded parameters are published, even if they are older than the 
+    last publication of the worker"""
+    while not Device.EventExit.is_set():
+        try:
+            devName, pars = pickle.loads(link.pubReceiver.recv_bytes())
+        except EOFError:
+            printe('Acquisition process exited')
+            Device.EventExit.set()
+            return
+        dev = Server.DevDict[devName]
+        for parName, (value, timestamp) in pars.items():
+            pv = dev.PV[parName]
+            pv.value = value
+            pv.timestamp = timestamp
+        dev.lastPublishTime = min(t for v,t in pars.values())
+        dev.publish()
 
 #````````````````````````````Base Classes`````````````````````````````````````
 class LDO():
@@ -264,11 +661,17 @@ class Device():
     server = None# It will keep the server device after initialization
     EventExit = threading.Event()
 
-    def __init__(self, name='?', pars={}):
-        """pars:   dictionary of {parameterName:LDO}"""
+    def __init__(self, name='?', pars={}, multicast=None):
+        """pars:   dictionary of {parameterName:LDO}
+        multicast: (group,port) for publishing to clients, which asked for it"""
         self.name = name
         self.lastPublishTime = 0.
         self.subscribers = {}
+        self.multicast = None if multicast is None else tuple(multicast)
+        self.multicastSubscribers = set()
+        self.shmSubscribers = set()# they get numpy values in shared memory
+        self.parityChunks = None# number of parity chunks or 'auto', if None, then ParityChunks is used
+        self.requestLock = threading.Lock()# serializes getters and setters, called from concurrent requests
         self.alreadyRunning = False
 
         requiredParameters = {
@@ -280,6 +683,9 @@ class Device():
           'clear': LDO('WE','Clear certain parameters', None,
             setter=self.set_clear),
         }
+        if multicast is not None:
+            requiredParameters['multicast'] = LDO('',
+              'Multicast group and port of publications', list(multicast))
         self.PV = requiredParameters
         # Add parameters
         self.PV.update(pars)
@@ -301,7 +707,8 @@ class Device():
         except Exception as e:
             print(f'Exception in setServerStatusText: {e}')
     #````````````````````````Subscriptions````````````````````````````````````
-    def register_subscriber(self, hostPort, sock, serverCmdArgs):
+    def register_subscriber(self, hostPort, sock, serverCmdArgs,
+          multicast=False, shm=False):
         printv(f'register subscriber for {serverCmdArgs}: {sock}')
         # the first dev,ldo in the list will trigger the publishing
         try:    cnsDevName,parPropVals = serverCmdArgs[0]
@@ -327,8 +734,20 @@ class Device():
             sock, argList, *_ =  self.subscribers[hostPort]
             serverCmdArgs = argList + serverCmdArgs
         self.subscribers[hostPort] = [sock, serverCmdArgs, 0, 0]
+        if multicast:
+            if self.multicast is None:
+                printw(f'Device {self.name} does not have multicast group')
+            else:
+                self.multicastSubscribers.add(hostPort)
+        if shm:
+            if shared_memory is None:
+                printw('Shared memory is not supported, python 3.8+ required')
+            else:
+                self.shmSubscribers.add(hostPort)
         l = len(self.subscribers)
         printv(f'subscription {self.name}#{l} added: {hostPort,serverCmdArgs}. sock: {sock}')
+        if _AcquisitionLink is not None:
+            _report_subscriptions()
         Device.server.PV['clientsInfo'].timestamp = time.time()# this will cause to publish it during heartbeat
 
     def get_statistics(self):
@@ -350,7 +769,11 @@ class Device():
             d[hostPort] = request
             printi(croppedText(f'subscriptions cancelled for {d}:'))
             del self.subscribers[hostPort]
+            self.multicastSubscribers.discard(hostPort)
+            self.shmSubscribers.discard(hostPort)
         Device.server.PV['clientsInfo'].timestamp = time.time()
+        if _AcquisitionLink is not None:
+            _report_subscriptions()
 
     def publish(self):
         """Publish fresh data to subscribers. 
@@ -361,6 +784,10 @@ class Device():
         Call this when the data are ready to be published to subscribers.
         usually at the end of the data processing.
         """
+        if _WorkerLinks and self.name != 'server':
+            # the workers publish to their subscribers
+            _forward_publication(self)
+            return 0
         if len(self.subscribers) == 0:
             return 0
         bytesShipped = 0
@@ -372,22 +799,37 @@ class Device():
             printi(f'publishing for {self.name} is unblocked after {round(time.time()-ts,6)}s')
         currentTime = time.time()
         #dt = [0.]*2
+        # subscribers with identical requests will get the same reply, it
+        # will be encoded once and sent to all of them at once
+        groups = {}
+        multicastRequests = {}
         #print(f'subscribers of {self.name}: {self.subscribers.keys()}')
         for hostPort, value in list(self.subscribers.items()):
             printv(f'serving {hostPort} {value}')
             ts = timer()
             sock, request, itemsLost, lastDelivered = value
+            if hostPort in self.multicastSubscribers:
+                # they do not acknowledge, they will ask for lost chunks
+                self.subscribers[hostPort][3] = currentTime
+                multicastRequests.setdefault(sock, []).append(request)
+                continue
             if Server.Dbg > 1:
                 printv(f'```````````````device {self.name} responding to {hostPort}:\n publishing request {request}')
             if UDP:
               #print(f'subscriber:{self.subscribers[hostPort]}')
               # check if previous delivery was succesful
               sockAddr = (sock,hostPort)
-              if sockAddr in list(_myUDPServer.ackCounts):
-                _myUDPServer.ackCounts[(sockAddr)][0] -= 1
-                ackCount = _myUDPServer.ackCounts[(sockAddr)][0]
+              key = _unacknowledged(sockAddr)
+              if key is not None:
+                try:
+                    _myUDPServer.ackCounts[key][0] -= 1
+                    ackCount = _myUDPServer.ackCounts[key][0]
+                except KeyError:# acknowledged in the meantime
+                    ackCount = MaxAckCount
                 printv(f'Missed ACK from {hostPort}: {ackCount}')
                 Server.Perf['Dropped'] += 1
+                if Pacing:
+                    _pacer(sockAddr).on_loss()
                 #if ackCount < MaxAckCount:
                 if ackCount <= 0:
                     printi(f'Client {hostPort} stuck {itemsLost+1} times in a row')
@@ -395,9 +837,13 @@ class Device():
                     Server.Perf['ItemsLost'] = itemsLost
                     self.subscribers[hostPort][2] = itemsLost
                     with ackCount_Lock:
-                        try:
-                            _myUDPServer.ackCounts[sockAddr][0] = MaxAckCount
-                        except KeyError:
+                        if len(key) > 2:
+                            # sequenced mode: give up on it, this frees the window
+                            _acknowledge(sockAddr, AckRange.pack(key[2],key[2]))
+                        else:
+                          try:
+                            _myUDPServer.ackCounts[key][0] = MaxAckCount
+                          except KeyError:
                             printw('Logic error in line 394')
                 if itemsLost >= ItemLostLimit:
                     printw((f'Subscription to {hostPort} cancelled, it was '\
@@ -405,7 +851,8 @@ class Device():
                     f'{request}'))
                     del self.subscribers[hostPort]
                     with ackCount_Lock:
-                        del _myUDPServer.ackCounts[sockAddr]
+                        _acknowledge(sockAddr)
+                    _myUDPServer.pacers.pop(sockAddr, None)
                     print(f'reduced subscribers: {self.subscribers.keys()}')
                     Device.server.PV['clientsInfo'].timestamp = currentTime
                     continue
@@ -417,13 +864,45 @@ class Device():
 
             # do publish
             self.subscribers[hostPort][3] = currentTime# update lastDelivered time
-
-            # _reply('read',...) will deliver only parameters with modified timestamp
-            #tn = timer(); dt[0] += tn - ts
-            r = _reply(['read',request], sock, hostPort)
-            printvv(f'<_reply: {r}')
-            #tn = timer(); dt[1] += tn - ts
-            bytesShipped += r
+            shm = hostPort in self.shmSubscribers
+            groups.setdefault((sock, repr((shm, request))), [request, [], shm]
+              )[1].append(hostPort)
+
+        # one publication to the multicast group for all its subscribers
+        for sock, requests in multicastRequests.items():
+            _open_multicast(sock, self.multicast)
+            groups[(sock, 'multicast')] = [_merge_requests(requests),
+              [self.multicast], False]
+
+        senders = _myUDPServer.senders if UDP else None
+        for (sock,_), (request, hostPorts, shm) in groups.items():
+            if senders is None:
+                # _reply('read',...) will deliver only parameters with modified timestamp
+                #tn = timer(); dt[0] += tn - ts
+                r = _reply(['read',request], sock, hostPorts[0], hostPorts[1:],
+                  self.parityChunks, shm)
+                printvv(f'<_reply: {r}')
+                #tn = timer(); dt[1] += tn - ts
+                bytesShipped += r
+                continue
+            # encode here, the sending is done by sender threads
+            reply = _encode_reply(['read',request], shm, _streaming(sock))
+            if reply is None:
+                continue
+            if Sendmmsg and len(hostPorts) > 1:
+                # one job for the group, the chunks for all its subscribers
+                # go in one sendmmsg, a slow subscriber delays the group
+                jobs = [((sock, tuple(hostPorts)), hostPorts[0],
+                  tuple(hostPorts[1:]))]
+            else:
+                jobs = [((sock,hostPort), hostPort, ()) for hostPort in hostPorts]
+            for key, hostPort, alsoTo in jobs:
+                dropped = senders.submit(key, _send, reply,
+                  sock, hostPort, alsoTo, self.parityChunks)
+                if dropped:
+                    printv(f'Outbound queue of {key[1]} is full')
+                    Server.Perf['QueueDrops'] += dropped
+            bytesShipped += len(reply)*len(hostPorts)
         self.lastPublishTime = time.time()
         publish_Lock.release()
         printv(f'published {bytesShipped} bytes')#, times:{[round(i,4) for i in dt]}') 
@@ -483,42 +962,450 @@ class Device():
         Device.EventExit.set()
 #,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
 #``````````````````functions for socket data preparation and sending``````````
+_SendmmsgAvailable = False
+_SockAddrs = {}# {hostPort: sockaddr_in} of sendmmsg() destinations
+if UDP and sys.platform.startswith('linux'):
+    # Linux fast path: many datagrams in one sendmmsg() syscall. It is not
+    # exposed by the socket module, so it is called through ctypes.
+    try:
+        import ctypes, ctypes.util, errno, os, struct
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint,
+          ctypes.c_int]
+        class _IOVec(ctypes.Structure):
+            _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+        class _MsgHdr(ctypes.Structure):
+            _fields_ = [('msg_name', ctypes.c_void_p),
+              ('msg_namelen', ctypes.c_uint32),
+              ('msg_iov', ctypes.c_void_p), ('msg_iovlen', ctypes.c_size_t),
+              ('msg_control', ctypes.c_void_p),
+              ('msg_controllen', ctypes.c_size_t), ('msg_flags', ctypes.c_int)]
+        class _MMsgHdr(ctypes.Structure):
+            _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+        class _PyBuffer(ctypes.Structure):
+            _fields_ = [('buf', ctypes.c_void_p), ('obj', ctypes.c_void_p),
+              ('len', ctypes.c_ssize_t), ('itemsize', ctypes.c_ssize_t),
+              ('readonly', ctypes.c_int), ('ndim', ctypes.c_int),
+              ('format', ctypes.c_char_p), ('shape', ctypes.c_void_p),
+              ('strides', ctypes.c_void_p), ('suboffsets', ctypes.c_void_p),
+              ('internal', ctypes.c_void_p)]
+        ctypes.pythonapi.PyObject_GetBuffer.argtypes = [ctypes.py_object,
+          ctypes.POINTER(_PyBuffer), ctypes.c_int]
+        ctypes.pythonapi.PyBuffer_Release.argtypes = [ctypes.POINTER(_PyBuffer)]
+        MaxMessagesPerCall = 1024# UIO_MAXIOV
+        _SendmmsgAvailable = True
+    except Exception as e:
+        printw(f'sendmmsg() not available: {e}')
+
+    def _buffer_address(obj):
+        """Address of the data of a bytes-like object. Works for read-only
+        memoryviews, the object should be kept alive while address is used."""
+        pybuf = _PyBuffer()
+        ctypes.pythonapi.PyObject_GetBuffer(obj, ctypes.byref(pybuf), 0)
+        address = pybuf.buf
+        ctypes.pythonapi.PyBuffer_Release(ctypes.byref(pybuf))
+        return address
+
+    def _sockaddr(hostPort):
+        """Cached sockaddr_in for (host,port)"""
+        try:
+            return _SockAddrs[hostPort]
+        except KeyError:
+            host, port = hostPort
+            sa = ctypes.create_string_buffer(struct.pack('=H', socket.AF_INET)
+              + struct.pack('!H', port) + socket.inet_aton(host) + bytes(8), 16)
+            _SockAddrs[hostPort] = sa
+            return sa
+
+    def _sendmmsg(sock, datagrams):
+        """Send list of (hostPort, prefix, chunk) datagrams using sendmmsg().
+        Returns number of sent datagrams and number of syscalls. If the socket
+        buffer is full, it returns early and remaining datagrams should be sent
+        by regular means."""
+        n = len(datagrams)
+        msgs = (_MMsgHdr * n)()
+        iovs = (_IOVec * (2*n))()
+        iovsAddress = ctypes.addressof(iovs)
+        iovSize = ctypes.sizeof(_IOVec)
+        for i,(hostPort, prefix, chunk) in enumerate(datagrams):
+            iovs[2*i].iov_base = _buffer_address(prefix)
+            iovs[2*i].iov_len = len(prefix)
+            iovs[2*i+1].iov_base = _buffer_address(chunk)
+            iovs[2*i+1].iov_len = len(chunk)
+            hdr = msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(_sockaddr(hostPort))
+            hdr.msg_namelen = 16
+            hdr.msg_iov = iovsAddress + 2*i*iovSize
+            hdr.msg_iovlen = 2
+        fd = sock.fileno()
+        msgsAddress = ctypes.addressof(msgs)
+        msgSize = ctypes.sizeof(_MMsgHdr)
+        sent, calls = 0, 0
+        while sent < n:
+            r = _libc.sendmmsg(fd, msgsAddress + sent*msgSize,
+              min(n - sent, MaxMessagesPerCall), 0)
+            calls += 1
+            if r < 0:
+                err = ctypes.get_errno()
+                if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    break
+                raise OSError(err, os.strerror(err))
+            sent += r
+        return sent, calls
+
 if UDP:
-  def _send_UDP(buf, sock, hostPort):
-    """Send buffer via UDP socket, chopping it to smaller chunks"""
-    with send_UDP_Lock:# prevent this method from re-entrancy
+  def _send_chunk(sock, hostPort, prefix, chunk):
+    """Send prefixed chunk in one datagram. The chunk is memoryview slice of
+    the reply buffer, with sendmsg() it is gathered by kernel without copying"""
+    if ScatterGather:
+        sock.sendmsg((prefix, chunk), (), 0, hostPort)
+    else:
+        sock.sendto(prefix + chunk, hostPort)
+
+  def _send_unix(buf, sock, path):
+    """Send buffer to local client over AF_UNIX datagram socket. The 
+    delivery is reliable, the chunks are large and not acknowledged, they
+    are prefixed with offset and sent in backward order, as for UDP. If 
+    the client is gone, then its subscriptions are cancelled."""
+    view = memoryview(buf)
+    last = (len(view)-1)//UnixChunkSize*UnixChunkSize
+    try:
+        for offset in range(last, -1, -UnixChunkSize):
+            sock.sendmsg((offset.to_bytes(PrefixLength,'big'),
+              view[offset:offset+UnixChunkSize]), (), 0, path)
+    except OSError as e:
+        printw(f'Local client {path} is not reachable: {e}')
+        # the publishing could be holding the publish_Lock
+        thread = threading.Thread(target=_cancel_client, args=(path,),
+          daemon=True)
+        thread.start()
+
+  def _cancel_client(hostPort):
+    """Cancel all subscriptions of the client"""
+    with publish_Lock:
+        for dev in list(Server.DevDict.values()):
+            if hostPort in dev.subscribers:
+                dev.unsubscribe(hostPort)
+
+  def _send_burst(sock, datagrams):
+    """Send list of (hostPort, prefix, chunk) datagrams, in one syscall if
+    sendmmsg is available, otherwise one by one"""
+    sent = 0
+    if Sendmmsg and _SendmmsgAvailable and len(datagrams) > 1:
+        try:
+            sent, calls = _sendmmsg(sock, datagrams)
+            Server.Perf['SyscallsSaved'] += sent - calls
+        except Exception as e:
+            printw(f'sendmmsg failed, falling back to sendmsg: {e}')
+    for hostPort, prefix, chunk in datagrams[sent:]:
+        _send_chunk(sock, hostPort, prefix, chunk)# 90% time spent here
+
+  def _send_chunks(sock, datagrams):
+    """Send list of (hostPort, prefix, chunk) datagrams in bursts, separated
+    by pauses. Without Pacing the bursts are single chunks if ChunkSleep is
+    set, otherwise all datagrams are sent in one burst."""
+    n = len(datagrams)
+    if Pacing and n > 1:
+        # the slowest of the destinations defines the pace
+        pacers = [_pacer((sock,hp)) for hp in {d[0] for d in datagrams}]
+        burst = min(p.burst for p in pacers)
+        gap = max(p.gap for p in pacers)
+    elif ChunkSleep and n > 1:
+        burst, gap = 1, ChunkSleep
+    else:
+        burst, gap = n, 0
+    for i in range(0, n, burst):
+        if i and gap:
+            time.sleep(gap)
+        _send_burst(sock, datagrams[i:i+burst])
+
+  def _chunks_info(view, seq=None, chunkSize=ChunkSize):
+    """Chop the view to chunks. Returns {(offset,size):(prefix,chunk)} in 
+    backward order. The chunks are views into the same buffer, the buffer is
+    retained until they are acknowledged. The prefix is the offset or, in 
+    sequenced mode, the SeqHeader"""
+    lbuf = len(view)
+    chunksInfo = {}
+    # send chunks in backward order
+    for iChunk in range((lbuf-1)//chunkSize, -1, -1):
+        prefixInt = iChunk*chunkSize
+        chunk = view[prefixInt:prefixInt+chunkSize]# no copy here
+        if seq is None:
+            prefixBytes = (prefixInt).to_bytes(PrefixLength,'big')
+        else:
+            prefixBytes = SeqHeader.pack(seq, prefixInt, lbuf, chunkSize, 0)
+        offsetSize = prefixInt, len(chunk)
+        #DNPprinti(f'chunk[{iChunk}]: {offsetSize}')
+        chunksInfo[(offsetSize)] = prefixBytes, chunk # <1 % here
+    return chunksInfo
+
+  def _unacknowledged(sockAddr):
+    """Key of ackCounts, which blocks the next delivery to the client: 
+    the previous reply or, in sequenced mode, the oldest reply when the 
+    window is full"""
+    client = _myUDPServer.clients.get(sockAddr)
+    if client is None:
+        return sockAddr if sockAddr in _myUDPServer.ackCounts else None
+    inflight = client.inflight
+    with ackCount_Lock:
+        # forget the replies, evicted from ackCounts
+        while inflight and (*sockAddr, inflight[0]) not in _myUDPServer.ackCounts:
+            inflight.popleft()
+        if len(inflight) < client.window:
+            return None
+        return (*sockAddr, inflight[0])
+
+  def _acknowledge(sockAddr, seqRange=b''):
+    """Forget acknowledged replies of a client. The seqRange is AckRange for
+    clients in sequenced mode, if it is empty, then all replies are 
+    forgotten. Should be called with ackCount_Lock."""
+    _myUDPServer.ackCounts.pop(sockAddr, None)
+    client = _myUDPServer.clients.get(sockAddr)
+    if client is None:
+        return
+    if seqRange:
+        first, last = AckRange.unpack(seqRange)
+    else:
+        first, last = 0, 0xFFFFFFFF
+    span = (last - first) & 0xFFFFFFFF
+    for seq in list(client.inflight):
+        if (seq - first) & 0xFFFFFFFF <= span:
+            client.inflight.remove(seq)
+            _myUDPServer.ackCounts.pop((*sockAddr, seq), None)
+
+  def _client_lost(sockAddr):
+    """Called when a reply to the client expired without acknowledge.
+    Subscriptions of the client are cancelled when ItemLostLimit of 
+    replies expired in a row"""
+    sock, hostPort = sockAddr
+    with publish_Lock:
+        for dev in list(Server.DevDict.values()):
+            value = dev.subscribers.get(hostPort)
+            if value is None:
+                continue
+            value[2] += 1
+            Server.Perf['ItemsLost'] = value[2]
+            if value[2] < ItemLostLimit:
+                continue
+            printw((f'Subscription of {hostPort} to {dev.name} cancelled, '
+              f'it did not acknowledge {value[2]} replies'))
+            dev.unsubscribe(hostPort)
+    if not any(hostPort in dev.subscribers for dev in Server.DevDict.values()):
+        _forget_client(sockAddr)
+
+  def _expire_leases():
+    """Cancel subscriptions of the clients, which did not renew their 
+    lease in time, and forget the replies, retained for them"""
+    now = time.time()
+    for hostPort, lease in list(_myUDPServer.leases.items()):
+        if now < lease[1]:
+            continue
+        printw(f'Lease of {hostPort} expired, it was silent for {lease[0]} s')
+        _myUDPServer.leases.pop(hostPort, None)
+        _cancel_client(hostPort)
+        for sock in _myUDPServer.sockets:
+            _forget_client((sock, hostPort))
+
+  def _retransmit_selected(sockAddr, nack):
+    """Resend in one burst the chunks, selected in the nack dictionary:
+    {'chunks':[indexes]} or {'bitmap':bytes}, where bit i (LSB first) of 
+    the bitmap marks the lost chunk i. In sequenced mode the nack should 
+    also have 'seq' and for multicast publications - the 'group'. Index of
+    a chunk is its offset divided by chunk size"""
+    seq = nack.get('seq')
+    key = sockAddr if seq is None else (*sockAddr, seq)
+    if 'group' in nack:# repair of the multicast publication
+        key = (sockAddr[0], tuple(nack['group']), seq)
+    chunksInfo = _myUDPServer.ackCounts.retained(key)
+    if chunksInfo is None:
+        printw(f'Nothing to retransmit for {key[1:]}')
+        return
+    indexes = nack.get('chunks')
+    if indexes is None:
+        bitmap = nack['bitmap']
+        indexes = [i for i in range(len(bitmap)*8) if (bitmap[i>>3]>>(i&7))&1]
+    indexes = set(indexes)
+    chunkSize = max(size for offset,size in chunksInfo)
+    datagrams = [(sockAddr[1],)+prefixChunk for (offset,size),prefixChunk
+      in chunksInfo.items() if offset//chunkSize in indexes]
+    printv(f'Retransmitting {len(datagrams)} chunks to {sockAddr[1]}')
+    senders = _myUDPServer.senders
+    if (Pacing or ChunkSleep) and len(datagrams) > 1 and senders is not None:
+        # the pauses between bursts should not stall the receive loop
+        dropped = senders.submit(sockAddr, _send_chunks, sockAddr[0],
+          datagrams)
+        Server.Perf['QueueDrops'] += dropped
+        return
+    _send_chunks(sockAddr[0], datagrams)
+
+  class _Pacer():
+    """Pace of sending chunks to a client. It is adapted to the losses:
+    every lost chunk or missed acknowledge halves the burst size and, when 
+    it is down to one chunk, doubles the gap between bursts, every 
+    acknowledge shrinks the gap and then grows the burst."""
+    MinGap = 0.0001
+    def __init__(self):
+        self.burst = PacingMaxBurst//4
+        self.gap = 0.
+        self.losses = 0
+        self.acks = 0
+
+    def on_loss(self):
+        self.losses += 1
+        if self.burst > 1:
+            self.burst //= 2
+        else:
+            self.gap = min(PacingMaxGap, max(_Pacer.MinGap, self.gap*2))
+
+    def on_ack(self):
+        self.acks += 1
+        if self.gap > 0.:
+            self.gap *= 0.8
+            if self.gap < _Pacer.MinGap:
+                self.gap = 0.
+        else:
+            self.burst = min(PacingMaxBurst, self.burst + 1)
+
+  def _pacer(sockAddr):
+    pacer = _myUDPServer.pacers.get(sockAddr)
+    if pacer is None:
+        pacer = _myUDPServer.pacers.setdefault(sockAddr, _Pacer())
+    return pacer
+
+  def _open_multicast(sock, group):
+    """Prepare the socket for sending to the multicast group. The 
+    publications to the group are sent in sequenced mode and kept for 
+    retransmission"""
+    if (sock,group) in _myUDPServer.clients:
+        return
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MulticastTTL)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+      socket.inet_aton(sock.getsockname()[0]))
+    client = _Client(MulticastRetain)
+    client.chunkSize = _chunk_size(group, None)
+    client.fec = True
+    client.multicast = True
+    _myUDPServer.clients[(sock,group)] = client
+    printi(f'Publishing to multicast group {group}')
+
+  _SendLocks = {}
+  def _send_lock(sockAddr):
+    """Lock, which serializes sending to a client"""
+    lock = _SendLocks.get(sockAddr)
+    if lock is None:
+        lock = _SendLocks.setdefault(sockAddr, threading.Lock())
+    return lock
+
+  def _forget_client(sockAddr):
+    """Drop the state of the client: retained replies, sequenced mode, 
+    pacer, sendmmsg() address and send lock. The lock, which is being used,
+    is kept"""
+    with ackCount_Lock:
+        _acknowledge(sockAddr)
+        _myUDPServer.clients.pop(sockAddr, None)
+    _myUDPServer.pacers.pop(sockAddr, None)
+    _SockAddrs.pop(sockAddr, None)
+    _myUDPServer.activity.pop(sockAddr, None)
+    lock = _SendLocks.get(sockAddr)
+    if lock is not None and lock.acquire(blocking=False):
+        del _SendLocks[sockAddr]
+        lock.release()
+
+  def _prune_clients():
+    """Forget the clients without subscriptions, which were idle for 
+    ClientIdleTime"""
+    now = time.time()
+    if now - _myUDPServer.pruneTime < ClientIdleTime/10:
+        return
+    _myUDPServer.pruneTime = now
+    subscribed = {hostPort for dev in list(Server.DevDict.values())
+      for hostPort in list(dev.subscribers)}
+    for sockAddr, lastTime in list(_myUDPServer.activity.items()):
+        if now - lastTime > ClientIdleTime and sockAddr[1] not in subscribed:
+            printv(f'Client {sockAddr[1]} is forgotten')
+            _forget_client(sockAddr)
+
+  def _parity_count(parity, nChunks):
+    """Number of parity chunks for a reply of nChunks. The parity is a 
+    number, 'auto' or None for ParityChunks"""
+    if parity is None:
+        parity = ParityChunks
+    if parity == 'auto':
+        # about two parity chunks for every retransmit request per reply
+        parity = math.ceil(2*Server.LossRate)
+    return min(int(parity), MaxParityChunks, nChunks-1)
+
+  def _parity_chunks(chunksInfo, nParity, chunkSize):
+    """XOR parity chunks. The parity j covers the chunks i, for which
+    i % nParity == j, shorter chunk is padded with zeros"""
+    parities = [0]*nParity
+    for (offset,size),(prefix,chunk) in chunksInfo.items():
+        parities[(offset//chunkSize)%nParity] ^= int.from_bytes(chunk,'little')
+    return [p.to_bytes(chunkSize,'little') for p in parities]
+
+  def _send_UDP(buf, sock, hostPort, alsoTo=(), parity=None):
+    """Send buffer via UDP socket, chopping it to smaller chunks.
+    The same buffer can be sent to other clients, listed in alsoTo.
+    The parity is number of parity chunks for clients, which accept them,
+    see _parity_count()"""
+    hostPorts = (hostPort, *alsoTo)
+    # prevent re-entrancy for the same client, other clients are not blocked
+    locks = [_send_lock((sock,hp)) for hp in sorted(hostPorts)]
+    for lock in locks:
+        lock.acquire()
+    try:
         lbuf = len(buf)
         printvv(f'>_send_UDP {lbuf} bytes to {hostPort}')
         ts = [0.]*6
         ts[0] = timer()
-        nChunks = (lbuf-1)//ChunkSize + 1
-        chunksInfo = {}
-        # send chunks in backward order
-        for iChunk in range(nChunks-1,-1,-1):
-            #ts[1] = timer()# 6% here
-            slice = iChunk*ChunkSize, min((iChunk+1)*ChunkSize, lbuf)
-            chunk = buf[slice[0]:slice[1]]
-            #ts[2] = timer()# 5% here
-            prefixInt = iChunk*ChunkSize
-            #print('pi',prefixInt)
-            prefixBytes = (prefixInt).to_bytes(PrefixLength,'big')
-            prefixed = b''.join([prefixBytes,chunk])# 5% here
-            offsetSize = prefixInt, len(chunk)
-            #DNPprinti(f'chunk[{iChunk}]: {offsetSize}')
-            chunksInfo[(offsetSize)] = prefixed # <1 % here
-            #ts[4] = timer()
-            sock.sendto(prefixed, hostPort) # 90% time spent here
-            if nChunks > 1:
-                time.sleep(ChunkSleep)
-
-        # register multi-chunk chunksInfo for acknowledge processing
-        if True:#lbuf >= ChunkSize:# Do not ask for acknowledge for 1-chunk transfers
-            with ackCount_Lock:
-                if (sock,hostPort) in _myUDPServer.ackCounts:
-                    printv(f'Client {hostPort} presumed dead')
-                    return
-                _myUDPServer.ackCounts[(sock,hostPort)] = [MaxAckCount, chunksInfo]
-                printvv(f'ackCounts for {hostPort} set to {MaxAckCount}')    
+        view = buf if isinstance(buf, _SegmentedReply) else memoryview(buf)
+        plainInfo = None# chunks for stop-and-wait clients, they are the same
+        parityCache = {}# parity chunks for each chunk size
+        registry = []
+        datagrams = []
+        for hp in hostPorts:
+            client = _myUDPServer.clients.get((sock,hp))
+            if client is None:
+                if plainInfo is None:
+                    plainInfo = _chunks_info(view)
+                key, chunksInfo = (sock,hp), plainInfo
+            else:
+                seq = client.next_seq()
+                key, chunksInfo = (sock,hp,seq), _chunks_info(view, seq,
+                  client.chunkSize)
+            registry.append((key, client, chunksInfo))
+            datagrams += [(hp,)+i for i in chunksInfo.values()]
+            if client is None or not client.fec:
+                continue
+            nParity = _parity_count(parity, len(chunksInfo))
+            if nParity <= 0:
+                continue
+            chunkSize = client.chunkSize
+            if chunkSize not in parityCache:
+                parityCache[chunkSize] = _parity_chunks(chunksInfo, nParity,
+                  chunkSize)
+            flags = FlagParity | nParity<<8
+            datagrams += [(hp, SeqHeader.pack(seq, j, lbuf, chunkSize, flags),
+              p) for j,p in enumerate(parityCache[chunkSize])]
+        # register chunksInfo for acknowledge processing before sending, the
+        # ACK, arriving during sending, will find it
+        registered = []
+        with ackCount_Lock:
+            for key, client, chunksInfo in registry:
+                if client is not None:
+                    client.inflight.append(key[2])
+                    if len(client.inflight) > client.window:
+                        oldest = client.inflight[0]
+                        _acknowledge(key[:2], AckRange.pack(oldest,oldest))
+                elif key in _myUDPServer.ackCounts:
+                    printv(f'Client {key[1]} presumed dead')
+                    continue
+                _myUDPServer.ackCounts[key] = [MaxAckCount, chunksInfo]
+                registered.append(key)
+                printvv(f'ackCounts for {key[1:]} set to {MaxAckCount}')    
+        _send_chunks(sock, datagrams)
+        # the wait for acknowledge starts after sending
+        _myUDPServer.ackCounts.restamp(registered)
 
         ts[5] = timer()
         dt = ts[5] - ts[0]
@@ -526,14 +1413,28 @@ if UDP:
             mbytes = 1e-6*len(buf)
             #dts = ts[1]-ts[0], ts[2]-ts[1], ts[3]-ts[2], ts[4]-ts[3], ts[5]-ts[4],
             #printi(f'sent {lbuf} b/{round(dt,4)}s, '+'perf: %.1f MB/s'%(mbytes/dt)+f' deltas(us): {[int(i*1e6) for i in dts]}')
-            Server.Perf['MBytes']  += mbytes
+            Server.Perf['MBytes']  += mbytes*len(hostPorts)
             Server.Perf['Seconds'] += dt
             Server.Perf['Sends']   += 1
         #DNPprint(f'<_send_UDP')
         #time.sleep(SendSleep)
-
-def _replyData(cmdArgs):
-    """Prepare data for reply"""
+    finally:
+        for lock in locks:
+            lock.release()
+
+def _merge_requests(requests):
+    """Merge subscription requests into one, which includes all parameters"""
+    merged = {}
+    for request in requests:
+        for cnsDevName,parPropVals in request:
+            parNames = merged.setdefault(cnsDevName, [])
+            parNames += [p for p in parPropVals[0] if p not in parNames]
+    return [[cnsDevName, [['*'] if '*' in parNames else parNames]]
+      for cnsDevName,parNames in merged.items()]
+
+def _replyData(cmdArgs, arrays=False):
+    """Prepare data for reply. If arrays, then the numpy values are not 
+    converted to bytes"""
     printvv(f'>_replyData {cmdArgs}')
     try:    cmd,args = cmdArgs
     except: 
@@ -569,18 +1470,19 @@ def _replyData(cmdArgs):
                 printvv(f'devName: {devName}')
                 cdn = NSDelimiter.join((cnsHost,devName))
                 devDict = _process_parameters(cmd, parNames, cdn,
-                  propNames, vals)
+                  propNames, vals, arrays)
                 returnedDict[cnsHost][devName] = list(devDict.keys())
             printvv(f'host devices: {returnedDict}')
         else:
             additionalDevDict = _process_parameters(cmd, parNames,
-              cnsDevName, propNames, vals)
+              cnsDevName, propNames, vals, arrays)
             #printv(croppedText(f'additional devDict: {additionalDevDict}'))
             returnedDict.update(additionalDevDict)
     printvv(f'<_replyData: {returnedDict}')
     return returnedDict
 
-def _process_parameters(cmd, parNames, cnsDevName, propNames, vals):
+def _process_parameters(cmd, parNames, cnsDevName, propNames, vals,
+      arrays=False):
     """part of _replyData"""
     devDict = {}
     host,devName = cnsDevName.split(':',1)
@@ -613,6 +1515,8 @@ def _process_parameters(cmd, parNames, cnsDevName, propNames, vals):
             try: # if value is numpy array:
                 dtype = str(value.dtype)
                 shape, dtype = value.shape, dtype
+                if arrays:
+                    return {propName:value, 'numpy':(shape,dtype)}
                 return {propName:value.tobytes(), 'numpy':(shape,dtype)}
             except:
                 #printv(f'not numpy {pv.name}')
@@ -634,7 +1538,8 @@ def _process_parameters(cmd, parNames, cnsDevName, propNames, vals):
                 
             # update value if command is get()
             if cmd == 'get':
-                pv.update_value()
+                with dev.requestLock:
+                    pv.update_value()
 
             #print(f'dev {cnsDevName}, pardict: {parDict}')
             devDict[':'.join((cnsDevName,parName))] = parDict
@@ -654,7 +1559,8 @@ def _process_parameters(cmd, parNames, cnsDevName, propNames, vals):
             if not isinstance(val,(list,array.array)):
                 val = [val]
             if True:#try:
-                pv.set(val)
+                with dev.requestLock:
+                    pv.set(val)
             else:#except Exception as e:
                 msg = f'in set {parName}: {e}'
                 printe(msg)
@@ -684,59 +1590,312 @@ def _process_parameters(cmd, parNames, cnsDevName, propNames, vals):
     #printv(f'devdict: {devDict}')
     return devDict
 
-def _reply(cmd, sock, client_address=None):
-    """Build a reply data and send it to client"""
-    #ts = []; ts.append(timer())
+def _acquisition_request(cmd):
+    """True if the request of a worker should be executed in the acquisition
+    process: get or set of the devices and the setting of the server 
+    parameters, which act on the devices or on the process"""
+    if cmd[0] not in ('get','set'):
+        return False
+    for cnsDevName, parPropVals in cmd[1]:
+        if cnsDevName.rsplit(NSDelimiter,1)[1] != 'server':
+            return True
+        if cmd[0] == 'set'\
+          and any(p in AcquisitionServerPars for p in parPropVals[0]):
+            return True
+    return False
+
+def _reply_object(cmd, shm=False, stream=False):
+    """Build a reply data. If the command failed, then the error message
+    is returned. If stream, then the numpy values are not converted to 
+    bytes"""
     try:
-        r = _replyData(cmd)
-        if len(r) == 0:
-            return 0
+        if cmd[0] == 'batch':
+            r = []
+            for sub in cmd[1]:
+                if not isinstance(sub, (list, tuple)) or len(sub) == 0\
+                  or sub[0] not in BatchCommands:
+                    r.append(f'ERR.LS. Not supported in batch: {sub}')
+                else:
+                    r.append(_reply_object(sub, shm))
+        elif _AcquisitionLink is not None and _acquisition_request(cmd):
+            # devices run in the acquisition process
+            r = _AcquisitionLink.request(cmd)
+        else:
+            r = _replyData(cmd, shm or stream)
+            if shm and len(r) != 0:
+                _to_shared_memory(r)
     except Exception as e:
             r = f'ERR.LS. Exception for cmd {cmd}: {e}'
             exc = traceback.format_exc()
             print('LS.Traceback: '+repr(exc))
+    return r
+
+def _encode_reply(cmd, shm=False, stream=False):
+    """Build a reply data and encode it. Returns None if nothing to reply.
+    If shm, then the numpy values are placed into shared memory rings.
+    If stream, then the reply is _SegmentedReply"""
+    #ts = []; ts.append(timer())
+    r = _reply_object(cmd, shm, stream)
+    if len(r) == 0 and cmd[0] != 'batch':# the batch is always replied
+        return None
     #printv(croppedText(f'reply_object={r}',100000))
     #ts.append(timer()); ts[-2] = round(ts[-1] - ts[-2],4)
     try:
         #reply = encoderDump(r, no_float32=False)# 75% time is spent here. no_float32 results in wrong timestamp
-        reply = encoderDump(r)#
+        if stream and isinstance(r, dict):
+            reply = _encode_segments(r)
+        else:
+            reply = encoderDump(r)#
     except Exception as e:
         reply = encoderDump(f'ERR.LS. Exception in dumpb: {e}')
     #ts.append(timer()); ts[-2] = round(ts[-1] - ts[-2],4)
+    return reply
+
+#````````````````````````````Streaming encoding```````````````````````````````
+class _SegmentedReply():
+    """Encoded reply as a sequence of buffers: pieces of the encoded 
+    skeleton and the buffers of numpy values. A slice within one buffer is
+    its view, a slice across buffers is joined into bytes."""
+    def __init__(self, segments):
+        self.segments = [memoryview(s).cast('B') for s in segments]
+        self.starts = []
+        size = 0
+        for segment in self.segments:
+            self.starts.append(size)
+            size += len(segment)
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, item):
+        start, stop, _ = item.indices(self.size)
+        i = bisect.bisect_right(self.starts, start) - 1
+        offset = start - self.starts[i]
+        if offset + stop - start <= len(self.segments[i]):
+            return self.segments[i][offset:offset + stop - start]
+        parts = []
+        while start < stop:
+            segment = self.segments[i][offset:offset + stop - start]
+            parts.append(segment)
+            start += len(segment)
+            i, offset = i + 1, 0
+        return b''.join(parts)
+
+    def tobytes(self):
+        return b''.join(self.segments)
+
+def _cbor_bytes_header(n):
+    """CBOR header of byte string of length n"""
+    if n < 24:
+        return bytes((0x40 + n,))
+    for info, size in ((24,1), (25,2), (26,4), (27,8)):
+        if n < 1 << 8*size:
+            return bytes((0x40 + info,)) + n.to_bytes(size, 'big')
+
+def _encode_segments(replyData):
+    """Encode reply data, which numpy values are not converted to bytes.
+    The values, larger than StreamMinSize, are replaced with unique 
+    placeholders, the encoded skeleton is split at the placeholders and the
+    array buffers are inserted between the pieces. The writable arrays are
+    copied, the device could modify them while the chunks are being sent or
+    retained for retransmission. The values of dtypes without buffer 
+    protocol (datetime64) or with objects are converted to bytes.
+    Returns _SegmentedReply"""
+    arrays = {}# {placeholder: array}
+    for parDict in replyData.values():
+        value = parDict.get('value') if isinstance(parDict, dict) else None
+        if value is None or 'numpy' not in parDict\
+          or isinstance(value, bytes):
+            continue
+        if value.nbytes < StreamMinSize or not value.flags['C_CONTIGUOUS']\
+          or value.dtype.hasobject:
+            parDict['value'] = value.tobytes()
+            continue
+        try:
+            memoryview(value)
+        except (ValueError, TypeError):# dtype has no buffer protocol
+            parDict['value'] = value.tobytes()
+            continue
+        placeholder = b'LS.segment' + os.urandom(6)
+        arrays[placeholder] = value.copy() if value.flags.writeable else value
+        parDict['value'] = placeholder
+    encoded = encoderDump(replyData)
+    skeleton = memoryview(encoded)
+    marks = sorted((encoded.index(encoderDump(p)), p) for p in arrays)
+    segments = []
+    start = 0
+    for position, placeholder in marks:
+        array = arrays[placeholder]
+        segments += [skeleton[start:position],
+          _cbor_bytes_header(array.nbytes), array]
+        start = position + len(encoderDump(placeholder))
+    segments.append(skeleton[start:])
+    return _SegmentedReply(segments)
+
+def _streaming(sock):
+    """True if the replies to the socket could be _SegmentedReply"""
+    return bool(StreamMinSize) and sock.type == socket.SOCK_DGRAM\
+      and sock.family == socket.AF_INET
+
+#````````````````````````````Shared memory````````````````````````````````````
+class _ShmRing():
+    """Ring of ShmSlots slots in shared memory for values of a parameter.
+    The ring starts with little-endian uint64 sequence counter of each slot,
+    the counter is odd while the slot is being written. The reader should 
+    copy the slot and check that its counter did not change."""
+    def __init__(self, slotSize):
+        self.slotSize = slotSize
+        self.headerSize = 8*ShmSlots
+        self.shm = shared_memory.SharedMemory(create=True,
+          size=self.headerSize + ShmSlots*slotSize)
+        self.shm.buf[:self.headerSize] = bytes(self.headerSize)
+        self.slot = ShmSlots - 1
+        self.seq = 0
+        atexit.register(self.release)
+        printv(f'Shared memory {self.shm.name} of {ShmSlots}*{slotSize} bytes')
+
+    def write(self, value):
+        """Copy numpy value into the next slot. Returns the reference:
+        [shared memory name, offset, number of bytes, slot, sequence]"""
+        self.slot = (self.slot + 1) % ShmSlots
+        self.seq += 2
+        counter = 8*self.slot
+        struct.pack_into('<Q', self.shm.buf, counter, self.seq - 1)
+        data = memoryview(value).cast('B') if value.flags['C_CONTIGUOUS']\
+          else value.tobytes()
+        offset = self.headerSize + self.slot*self.slotSize
+        self.shm.buf[offset:offset+len(data)] = data
+        struct.pack_into('<Q', self.shm.buf, counter, self.seq)
+        return [self.shm.name, offset, len(data), self.slot, self.seq]
+
+    def release(self):
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except (FileNotFoundError, BufferError):
+            pass
+
+_ShmRings = {}# {'host:dev:par': _ShmRing}
+def _to_shared_memory(replyData):
+    """Place the numpy values of the reply data into shared memory rings,
+    the values are replaced with 'shm' references. The small values are
+    converted to bytes"""
+    for key, parDict in replyData.items():
+        value = parDict.get('value')
+        if 'numpy' not in parDict or isinstance(value, bytes):
+            continue
+        if value.nbytes < ShmMinSize:
+            parDict['value'] = value.tobytes()
+            continue
+        ring = _ShmRings.get(key)
+        if ring is None or ring.slotSize < value.nbytes:
+            if ring is not None:
+                ring.release()
+            ring = _ShmRings[key] = _ShmRing(value.nbytes)
+        del parDict['value']
+        parDict['shm'] = ring.write(value)
+
+def _reply(cmd, sock, client_address=None, alsoTo=(), parity=None, shm=False):
+    """Build a reply data and send it to client and to clients in alsoTo"""
+    reply = _encode_reply(cmd, shm, _streaming(sock))
+    if reply is None:
+        return 0
     #printv(f'reply {len(reply)} bytes, doubles={no_float32}')
     #printv(croppedText(f'sending back {len(reply)} bytes to {client_address}'))
     #ts.append(timer()); ts[-2] = round(ts[-1] - ts[-2],4)
-    if UDP:
-        host,port = client_address# the port here is temporary
-        _send_UDP(reply, sock, client_address)# 25% time spent here
-        # initiate the sending of EOD to that client
-    else:
-        sock.sendall(reply)
-        printi(f'TCP reply sent {reply}')
+    _send(reply, sock, client_address, alsoTo, parity)# 25% time spent here
     #ts.append(timer()); ts[-2] = round(ts[-1] - ts[-2],4)
     #print(f'reply times: {ts[:-1]}')
-    return len(reply)
+    return len(reply)*(1 + len(alsoTo))
+
+class _ReplyCache():
+    """Encoded replies to recent requests, {key: (time, reply)}. The replies
+    older than ReplyCacheTime are dropped, the oldest replies are dropped 
+    when their bytes exceed ReplyCacheBudget."""
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+
+    def get(self, key):
+        with self.lock:
+            self._expire(time.time())
+            entry = self.entries.get(key)
+        return None if entry is None else entry[1]
+
+    def put(self, key, reply):
+        if len(reply) > ReplyCacheBudget:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[1])
+            self.entries[key] = (time.time(), reply)
+            self.bytes += len(reply)
+            self._expire(time.time())
+
+    def _expire(self, now):
+        while self.entries:
+            key, (t, reply) = next(iter(self.entries.items()))
+            if now - t <= ReplyCacheTime and self.bytes <= ReplyCacheBudget:
+                break
+            del self.entries[key]
+            self.bytes -= len(reply)
+
+_replyCache = _ReplyCache()
+
+def _reply_cached(cmd, sockAddr):
+    """Reply to the request with 'rid', the duplicates of the request are
+    answered from the _replyCache"""
+    sock,client_address = sockAddr
+    # the rid could be reused by the client for a different request
+    key = (client_address, cmd.get('pid'), cmd['rid'], repr(cmd['cmd']))
+    reply = _replyCache.get(key)
+    if reply is None:
+        reply = _encode_reply(cmd['cmd'])
+        if reply is None:
+            return
+        _replyCache.put(key, reply)
+    else:
+        printv(f'Duplicate request {key}, replied from cache')
+    _send(reply, sock, client_address)
 #,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
 #````````````````````````````The Request broker```````````````````````````````
 def handle_socketData(data:str, sockAddr=None):
     global LastPID
-    if UDP:
-        sock,client_address = sockAddr
-        if data == b'ACK':
-            with send_UDP_Lock: # we need to wait when sending is done
-                printvv(f'Got ACK from {client_address}')
-                with ackCount_Lock:
-                    if sockAddr in _myUDPServer.ackCounts:
-                        printvv(f'deleting ackCount {sockAddr}')
-                        del _myUDPServer.ackCounts[sockAddr]
+    sock,client_address = sockAddr
+    # the replies to UDP datagrams are acknowledged
+    datagram = UDP and sock.type == socket.SOCK_DGRAM\
+      and sock.family == socket.AF_INET
+    if datagram:
+        _myUDPServer.activity[sockAddr] = time.time()
+        lease = _myUDPServer.leases.get(client_address)
+        if lease is not None:
+            lease[1] = time.time() + lease[0]
+        if data[:len(Keepalive)] == Keepalive:
+            printvv(f'Keepalive from {client_address}')
+            return
+        if data[:3] == b'ACK':
+            seqRange = data[3:]
+            if seqRange and len(seqRange) != AckRange.size:
+                printw(f'Wrong ACK from {client_address}: {bytes(data)}')
                 return
+            # the reply is registered before sending, no need to wait 
+            # until the sending is done
+            printvv(f'Got ACK{bytes(seqRange)} from {client_address}')
+            with ackCount_Lock:
+                _acknowledge(sockAddr, seqRange)
+            if Pacing:
+                _pacer(sockAddr).on_ack()
+            return
     
-    data = data.strip()
+    # data are not stripped, the encoded request may end with whitespace byte
     #printv(f'data: {data}')
     try:
         cmd = encoderLoad(data)
     except:
-        msg = f'ERR.LS: Wrong command format (not {encoder.__name__}): {data}'
+        msg = f'ERR.LS: Wrong command format (not {encoder.__name__}): {bytes(data)}'
         printw(msg)
         return
     #printi((f'Client {client_address} wrote:\n{cmd}'))
@@ -758,31 +1917,70 @@ def handle_socketData(data:str, sockAddr=None):
         #raise  KeyError("'cmd' key missing in request")
         printw("'cmd' key missing in request")
         return
-
-    if cmdArgs[0] == 'unsubscribe':
-        #print(f'cmdArgs: {cmdArgs} from {client_address}')
-        for devName,dev in Server.DevDict.items():
-            #printi(f'unsubscribing {client_address} from {devName}')
-            dev.unsubscribe(client_address)
-        return
+    if datagram and cmdArgs[0] != 'retransmit':
+        # the retransmit request refers to the retained replies, it should
+        # not change the mode
+        _set_mode(sockAddr, cmd)
 
     if cmdArgs[0] == 'retransmit':
         Server.Perf['Retransmits'] += 1
+        if Pacing:
+            _pacer(sockAddr).on_loss()
         printv(f'Retransmit {cmdArgs} from {sockAddr}, ackCount:{_myUDPServer.ackCounts.keys()}')
-        if not sockAddr in _myUDPServer.ackCounts:
-                printw(f'sockaddr wrong\n{sockAddr}')
+        if isinstance(cmdArgs[1], dict):
+            _retransmit_selected(sockAddr, cmdArgs[1])
+            return
+        # in sequenced mode the sequence number follows the offsetSize
+        key = sockAddr if len(cmdArgs) < 3 else (*sockAddr, cmdArgs[2])
+        chunksInfo = _myUDPServer.ackCounts.retained(key)
+        if chunksInfo is None:
+                printw(f'sockaddr wrong\n{key}')
                 return
                 
         #printw(croppedText(f'Retransmitting: {cmd}'))#: {_myUDPServer.ackCounts[sockAddr][0],_myUDPServer.ackCounts[sockAddr][1].keys()}'))
         offsetSize = tuple(cmdArgs[1])
         try:
-            chunk = _myUDPServer.ackCounts[sockAddr][1][offsetSize]
+            prefix, chunk = chunksInfo[offsetSize]
         except Exception as e:
             msg = f'in LDO_Handle: {e}, sa:{sockAddr[1]}, os:{offsetSize}'
             printe(msg)
             raise RuntimeError(msg)
         #DNTprint(f'sending {len(chunk)} bytes of chunk {offsetSize} to {sockAddr[1]}')
-        sock.sendto(chunk, sockAddr[1])
+        _send_chunk(sock, sockAddr[1], prefix, chunk)
+        return
+
+    handlers = _myUDPServer.handlers if UDP else None
+    if handlers is None:
+        _handle_command(cmdArgs, cmd, sockAddr)
+        return
+    # slow getters and setters should not block the receive loop,
+    # the requests of the same client are handled in order
+    handlers.submit(sockAddr, _handle_command, cmdArgs, cmd, sockAddr)
+
+def _request_dropped(cmdArgs, cmd, sockAddr):
+    """Called when the request queue of a client is full and its oldest
+    request is dropped without reply"""
+    Server.Perf['RequestDrops'] += 1
+    if cmdArgs[0] == 'set':
+        printw(croppedText(f'Request queue of {sockAddr[1]} is full,'
+          f' dropped: {cmdArgs}'))
+    else:
+        printv(f'Request queue of {sockAddr[1]} is full, dropped {cmdArgs[0]}')
+
+def _handle_command(cmdArgs, cmd, sockAddr):
+    """Execute the command and reply to the client"""
+    sock,client_address = sockAddr
+    if cmdArgs[0] == 'unsubscribe':
+        #print(f'cmdArgs: {cmdArgs} from {client_address}')
+        for devName,dev in Server.DevDict.items():
+            #printi(f'unsubscribing {client_address} from {devName}')
+            dev.unsubscribe(client_address)
+        if UDP:
+            _myUDPServer.leases.pop(client_address, None)
+        return
+
+    if cmdArgs[0] == 'batch':
+        _reply(cmdArgs, *sockAddr)
         return
 
     try:
@@ -798,27 +1996,329 @@ def handle_socketData(data:str, sockAddr=None):
         "[['host,dev1', [parameters]]]\ngot: "+str(cmdArgs[1])))
 
     if  cmdArgs[0] == 'subscribe':
+        datagram = UDP and sock.type == socket.SOCK_DGRAM\
+          and sock.family == socket.AF_INET
+        bulkSock = _myUDPServer.bulkSock if datagram else None
+        # the leases are renewed by datagrams of the UDP clients
+        lease = cmd.get('lease', LeaseTime) if datagram else 0
+        if lease:
+            _myUDPServer.leases[client_address] = [lease, time.time() + lease]
+        if bulkSock is not None:
+            # publications will be sent from the bulk port
+            sock = bulkSock
+            _set_mode((sock, client_address), cmd)
         printv(f'>register_subscriber {client_address} for cmd {cmdArgs}, sock: {sock}')
-        dev.register_subscriber(client_address, sock, cmdArgs[1])                
+        dev.register_subscriber(client_address, sock, cmdArgs[1],
+          cmd.get('multicast', False), cmd.get('shm', False))
         return
 
+    if 'rid' in cmd and cmdArgs[0] in CachedCommands:
+        _reply_cached(cmd, sockAddr)
+        return
     r = _reply(cmdArgs, *sockAddr)
 #,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
 if UDP:
   #````````````````````````````Server```````````````````````````````````````````
+  class _Client():
+    """State of a client in sequenced mode: up to window replies can be
+    in flight, they are acknowledged by their sequence numbers"""
+    def __init__(self, window):
+        self.window = window
+        self.chunkSize = ChunkSize
+        self.requestedChunkSize = None
+        self.fec = False# client accepts parity chunks
+        self.multicast = False# the client is multicast group, it does not acknowledge
+        self.seq = 0# sequence number of the last reply
+        self.inflight = collections.deque()# unacknowledged sequence numbers
+
+    def next_seq(self):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return self.seq
+
+  def _chunk_size(hostPort, requested):
+    """Chunk size for a client in sequenced mode. If requested is 'mtu' or
+    it is not provided and MTUChunking is set, then chunk with headers 
+    should fit into the path MTU"""
+    if requested is None:
+        requested = 'mtu' if MTUChunking else ChunkSize
+    if requested == 'mtu':
+        # IP header: 20, UDP header: 8 
+        requested = path_mtu(hostPort[0]) - 28 - SeqHeader.size
+    return max(256, min(int(requested), ChunkSize))
+
+  def _set_mode(sockAddr, request):
+    """Switch the client to sequenced mode if window is provided in its
+    request, 'window':0 switches it back to stop-and-wait mode. The mode 
+    is not changed by requests without 'window'."""
+    clients = _myUDPServer.clients
+    if 'window' not in request:
+        return
+    window = request['window']
+    if not window:
+        if sockAddr in clients:
+            with ackCount_Lock:
+                _acknowledge(sockAddr)
+                del clients[sockAddr]
+        return
+    window = min(int(window), MaxWindow)
+    requested = request.get('chunkSize')
+    client = clients.get(sockAddr)
+    fec = bool(request.get('fec'))
+    if client is None:
+        client = _Client(window)
+        client.fec = fec
+        client.requestedChunkSize = requested
+        client.chunkSize = _chunk_size(sockAddr[1], requested)
+        with ackCount_Lock:
+            _acknowledge(sockAddr)
+            clients[sockAddr] = client
+        printv((f'Client {sockAddr[1]} is in sequenced mode, window: {window}'
+          f', chunkSize: {client.chunkSize}'))
+    else:
+        client.window = window
+        client.fec = fec
+        if requested != client.requestedChunkSize:
+            client.requestedChunkSize = requested
+            client.chunkSize = _chunk_size(sockAddr[1], requested)
+
+  class _RetainStore():
+    """Unacknowledged replies, kept for retransmission, 
+    {key: [ackCount, chunksInfo]}. The bytes of the retained buffers are
+    accounted, the buffer, shared by several keys, is counted once. When the
+    bytes exceed RetainBudget, the least recently used replies are evicted,
+    the replies older than RetainTime are evicted as well."""
+    def __init__(self):
+        self.entries = {}# {key: [ackCount, chunksInfo]}, the oldest first
+        self.times = {}# time of storing or retransmission for each key
+        self.buffers = {}# {id(chunksInfo): [nBytes, number of keys]}
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):    return key in self.entries
+    def __getitem__(self, key):     return self.entries[key]
+    def __len__(self):              return len(self.entries)
+    def keys(self):                 return self.entries.keys()
+
+    def __setitem__(self, key, entry):
+        self.pop(key, None)
+        chunksInfo = entry[1]
+        now = time.time()
+        with self.lock:
+            self.entries[key] = entry
+            self.times[key] = now
+            ref = self.buffers.get(id(chunksInfo))
+            if ref is None:
+                nBytes = sum(size for offset,size in chunksInfo)
+                self.buffers[id(chunksInfo)] = [nBytes, 1]
+                self.bytes += nBytes
+            else:
+                ref[1] += 1
+            evicted = []
+            for k in list(self.entries):# the oldest first
+                if k == key:
+                    continue
+                if now - self.times[k] <= RetainTime\
+                  and self.bytes <= RetainBudget:
+                    break
+                self._release(k)
+                evicted.append(k)
+        if evicted:
+            Server.Perf['Evictions'] += len(evicted)
+            printv(f'Evicted from retransmit store: {evicted}')
+
+    def pop(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key, default)
+            if key in self.entries:
+                self._release(key)
+            return entry
+
+    def _release(self, key):
+        """Remove the key and account bytes, should be called with lock"""
+        entry = self.entries.pop(key)
+        del self.times[key]
+        ref = self.buffers[id(entry[1])]
+        ref[1] -= 1
+        if ref[1] == 0:
+            del self.buffers[id(entry[1])]
+            self.bytes -= ref[0]
+
+    def retained(self, key):
+        """The chunksInfo for retransmission or None if it is not retained"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key)
+            return entry[1]
+
+    def _touch(self, key):
+        """The entry is used, move it to the end, should be called with lock"""
+        self.entries[key] = self.entries.pop(key)
+        self.times[key] = time.time()
+
+    def restamp(self, keys):
+        """Restart waiting for acknowledge of the keys"""
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                if key in self.times:
+                    self.times[key] = now
+
+    def overdue(self, timeout):
+        """Keys, which were not stored or retransmitted during timeout"""
+        now = time.time()
+        with self.lock:
+            return [k for k,t in self.times.items() if now - t > timeout]
+
+    def probe(self, key):
+        """Decrement ackCount of the overdue entry. Returns chunksInfo if
+        it should be probed, or None if it expired or was acknowledged."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry[0] -= 1
+            if entry[0] <= 0:
+                return None
+            self._touch(key)
+            return entry[1]
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return round(100.*self.hits/total, 1) if total else 100.
+
+  def _set_buffer_sizes(sockets, sndbuf, rcvbuf):
+    """Set SO_SNDBUF and SO_RCVBUF of the sockets, 0 keeps the current 
+    size. Returns the actual sizes of the first socket, Linux doubles the 
+    requested size and limits it with net.core.wmem_max/rmem_max."""
+    for sock in sockets:
+        if sndbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+        if rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    if len(sockets) == 0:
+        return sndbuf, rcvbuf
+    actual = [sockets[0].getsockopt(socket.SOL_SOCKET, opt)
+      for opt in (socket.SO_SNDBUF, socket.SO_RCVBUF)]
+    for name,requested,size in zip(('SO_SNDBUF','SO_RCVBUF'),
+      (sndbuf,rcvbuf), actual):
+        if size < requested:
+            printw(f'{name} is limited to {size}, check sysctl net.core')
+    return actual
+
+  def _proc_udp_drops(ports):
+    """Receive drops of the UDP sockets, bound to the ports, counted by 
+    kernel in /proc/net/udp (Linux)"""
+    drops = 0
+    try:
+        with open('/proc/net/udp') as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if int(fields[1].split(':')[1], 16) in ports:
+                    drops += int(fields[-1])
+    except (OSError, ValueError, IndexError, StopIteration):
+        return 0
+    return drops
+
   class _myUDPServer():
-    ackCounts = {}
+    ackCounts = _RetainStore()
+    clients = {}# _Client states of clients in sequenced mode
+    pacers = {}# _Pacer of each client if Pacing is enabled
+    senders = None# _KeyedPool of threads, sending publications
+    handlers = None# _KeyedPool of threads, handling the requests
+    bulkSock = None# socket for publications if BulkPort is set
+    unixSock = None# socket for local clients if UnixPath is set
+    sockets = []# UDP sockets of the server, the first one is the control socket
+    leases = {}# [lease, expiration time] of subscriptions of the clients
+    activity = {}# time of the last datagram from each client
+    pruneTime = 0.# time of the last _prune_clients()
+    rxqDrops = {}# kernel receive drops of the served sockets, by SO_RXQ_OVFL
     def __init__(self, hostPort):#, handler):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.settimeout(1)
+        if Workers:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         # Bind the socket to the port
         print(f'starting UDP on port {hostPort}')
         self.sock.bind(hostPort)
+        if BulkPort:
+            bulkSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            bulkSock.settimeout(1)
+            bulkSock.bind((hostPort[0], BulkPort))
+            _myUDPServer.bulkSock = bulkSock
+        _myUDPServer.sockets = [s for s in (self.sock, _myUDPServer.bulkSock)
+          if s is not None]
+        _set_buffer_sizes([self.sock], SendBuffer, ReceiveBuffer)
+        if _myUDPServer.bulkSock is not None:
+            _set_buffer_sizes([_myUDPServer.bulkSock], BulkSendBuffer,
+              ReceiveBuffer)
+        if UnixPath:
+            if os.path.exists(UnixPath):
+                os.unlink(UnixPath)
+            unixSock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            unixSock.settimeout(1)
+            print(f'starting AF_UNIX on {UnixPath}')
+            unixSock.bind(UnixPath)
+            atexit.register(os.unlink, UnixPath)
+            _myUDPServer.unixSock = unixSock
+        if SenderThreads > 0:
+            _myUDPServer.senders = _KeyedPool('sender', SenderThreads,
+              OutboundQueueSize)
+        if RequestThreads > 0:
+            _myUDPServer.handlers = _KeyedPool('handler', RequestThreads,
+              RequestQueueSize, _request_dropped)
+
+    def _service_loop(self):
+        while not Device.EventExit.wait(ServiceInterval):
+            try:
+                self.service_actions()
+            except Exception as e:
+                printe(f'in service_actions: {e}: {traceback.format_exc()}')
 
     def service_actions(self):
-        """Service_actions() called by server periodically with AckInterval."""
-        # Don't do anything
-        return
+        """Called periodically with ServiceInterval. The replies, which 
+        were not acknowledged during AckTimeout are probed: in sequenced mode
+        the last chunk of the reply is re-sent, the client should acknowledge
+        it or ask for lost chunks. The stop-and-wait clients are not probed.
+        After MaxAckCount probes the reply expires and it is counted as lost
+        for the client. The subscriptions with expired leases are cancelled,
+        the idle clients are forgotten."""
+        _expire_leases()
+        _prune_clients()
+        store = _myUDPServer.ackCounts
+        for key in store.overdue(AckTimeout):
+            sockAddr = key[:2]
+            client = _myUDPServer.clients.get(sockAddr)
+            if client is not None and client.multicast:
+                continue
+            lock = _send_lock(sockAddr)
+            if not lock.acquire(blocking=False):
+                continue# it is being served
+            try:
+                with ackCount_Lock:
+                    if key not in store:# acknowledged in the meantime
+                        continue
+                    chunksInfo = store.probe(key)
+                    if chunksInfo is None:
+                        printv(f'Reply to {key[1:]} expired')
+                        if len(key) > 2:
+                            _acknowledge(sockAddr, AckRange.pack(key[2],key[2]))
+                        else:
+                            store.pop(key)
+                if chunksInfo is not None and len(key) > 2:
+                    prefix, chunk = list(chunksInfo.values())[-1]
+                    _send_chunk(sockAddr[0], sockAddr[1], prefix, chunk)
+                    Server.Perf['Probes'] += 1
+            finally:
+                lock.release()
+            if chunksInfo is None:
+                _client_lost(sockAddr)
 
 class LDO_clientsInfo(LDO):
     '''Debugging LDO, providing textual dictionary of all subscribers.''' 
@@ -833,13 +2333,21 @@ class LDO_clientsInfo(LDO):
                 sock, request, itemsLost, lastDelivered = value
                 dt = round(currentTime - lastDelivered, 6)
                 d[devName][hostPort] = dt,request
+                pacer = _myUDPServer.pacers.get((sock,hostPort)) if UDP else None
+                if pacer is not None:
+                    d[devName][hostPort] += ({'burst':pacer.burst,
+                      'gap':round(pacer.gap,6), 'losses':pacer.losses},)
+                lease = _myUDPServer.leases.get(hostPort) if UDP else None
+                if lease is not None:
+                    d[devName][hostPort] += ({'lease':lease[0],
+                      'expires':round(lease[1] - currentTime, 3)},)
         self.value = [pformat(d)]
         self.timestamp = currentTime
 
 class ServerDev(Device):
     """Unique server device"""
     PollingInterval = 1.
-    def __init__(self, name):
+    def __init__(self, name, heartbeatThread=True):
         # create parameters
         pars = {
             'version':LDO('','liteServer',[__version__]),
@@ -854,15 +2362,26 @@ class ServerDev(Device):
               setter=self._reset),
             'lastPID': LDO('','report source of the last request ',['?']),
             'perf':   LDO('R'\
-            ,'Performance: RQ,MBytes,MBytes/s,Retransmits,Losts,Dropped'\
-            ,[0., 0., 0., 0, 0, 0]),
+            ,('Performance: RQ,MBytes,MBytes/s,Retransmits,Losts,Dropped,'
+            'SyscallsSaved,QueueDrops,RetainedMB,Evictions,RetainHits%,Probes,'
+            'KernelRxqDrops,KernelUdpDrops,RequestDrops')\
+            ,[0., 0., 0., 0, 0, 0, 0, 0, 0., 0, 0., 0, 0, 0, 0]),
             'statistics': LDO('R','Number of items and subscriptions in circulations',[0,0]),
             'clientsInfo': LDO_clientsInfo('R','Info on all subscriptions',['']),
         }
+        if UDP:
+            pars['sndbuf'] = LDO('RWE','Requested SO_SNDBUF of the UDP port',
+              [SendBuffer], units='B', setter=self._set_buffers)
+            pars['rcvbuf'] = LDO('RWE','Requested SO_RCVBUF of the UDP port',
+              [ReceiveBuffer], units='B', setter=self._set_buffers)
+            pars['socketBuffers'] = LDO('R',('Actual SO_SNDBUF and SO_RCVBUF'
+              ' of the UDP port, Linux doubles the requested sizes'), [0, 0],
+              units='B')
         super().__init__(name, pars)
-        self.heartbeatPrevs = [0.,0.]
-        thread = threading.Thread(target=self._heartbeat, daemon=True)
-        thread.start()
+        self.heartbeatPrevs = [0., 0., 0, 0]
+        if heartbeatThread:
+            thread = threading.Thread(target=self._heartbeat, daemon=True)
+            thread.start()
 
     def _debug_set(self, *_):
         par_debug =self.PV['debug'].value
@@ -870,34 +2389,62 @@ class ServerDev(Device):
         Server.Dbg = par_debug[0]
         printi('Debugging level set to '+str(Server.Dbg))
 
+    def _set_buffers(self, *_):
+        """Apply sndbuf and rcvbuf to the control socket, the bulk socket 
+        keeps BulkSendBuffer. The actual sizes are shown in socketBuffers"""
+        actual = _set_buffer_sizes(_myUDPServer.sockets[:1],
+          self.PV['sndbuf'].value[0], self.PV['rcvbuf'].value[0])
+        self.PV['socketBuffers'].set_valueAndTimestamp(list(actual))
+
     def _heartbeat(self):
         printi('Heartbeat thread started')
         while not Device.EventExit.is_set():
             Device.EventExit.wait(10)
             #print(f'HB_proc {time.time()}')
-            ts = time.time()
-            subscriptions = 0
-            nItems = 0
-            nSockets = 0
-            for devName,dev in Server.DevDict.items():
-                ns,ni,*_ = dev.get_statistics()
-                #printi(f'dev {devName}, has {ns} subscriptions for for total of {ni} items')
-                nItems += ni
-                nSockets += ns
-            self.PV['statistics'].set_valueAndTimestamp([nItems,nSockets], ts)
-            try:
-                dt = Server.Perf['Seconds'] - self.heartbeatPrevs[1]
-                mbps = round((Server.Perf['MBytes'] - self.heartbeatPrevs[0])/dt, 1)
-            except:
-                mbps = 0.
-            self.PV['perf'].set_valueAndTimestamp([Server.Perf['Sends'],
-                round(Server.Perf['MBytes'],3), mbps,
-                Server.Perf['Retransmits'], Server.Perf['ItemsLost'],
-                Server.Perf['Dropped']], ts)
-            self.heartbeatPrevs = Server.Perf['MBytes'], Server.Perf['Seconds']
-            self.publish()
+            self.beat()
         printi('Heartbeat stopped')
 
+    def beat(self):
+        """Update and publish the server statistics, called every 10 s"""
+        ts = time.time()
+        subscriptions = 0
+        nItems = 0
+        nSockets = 0
+        for devName,dev in Server.DevDict.items():
+            ns,ni,*_ = dev.get_statistics()
+            #printi(f'dev {devName}, has {ns} subscriptions for for total of {ni} items')
+            nItems += ni
+            nSockets += ns
+        self.PV['statistics'].set_valueAndTimestamp([nItems,nSockets], ts)
+        try:
+            dt = Server.Perf['Seconds'] - self.heartbeatPrevs[1]
+            mbps = round((Server.Perf['MBytes'] - self.heartbeatPrevs[0])/dt, 1)
+        except:
+            mbps = 0.
+        if UDP:
+            store = _myUDPServer.ackCounts
+            retainedMB, hitRate = round(store.bytes*1e-6,3), store.hit_rate()
+            rxqDrops = sum(_myUDPServer.rxqDrops.values())
+            udpDrops = _proc_udp_drops({s.getsockname()[1]
+              for s in _myUDPServer.sockets})
+        else:
+            retainedMB, hitRate, rxqDrops, udpDrops = 0., 100., 0, 0
+        self.PV['perf'].set_valueAndTimestamp([Server.Perf['Sends'],
+            round(Server.Perf['MBytes'],3), mbps,
+            Server.Perf['Retransmits'], Server.Perf['ItemsLost'],
+            Server.Perf['Dropped'], Server.Perf['SyscallsSaved'],
+            Server.Perf['QueueDrops'], retainedMB,
+            Server.Perf['Evictions'], hitRate,
+            Server.Perf['Probes'], rxqDrops, udpDrops,
+            Server.Perf['RequestDrops']], ts)
+        sends = Server.Perf['Sends'] - self.heartbeatPrevs[2]
+        if sends > 0:
+            Server.LossRate = (Server.Perf['Retransmits']
+              - self.heartbeatPrevs[3])/sends
+        self.heartbeatPrevs = Server.Perf['MBytes'], Server.Perf['Seconds'],\
+          Server.Perf['Sends'], Server.Perf['Retransmits']
+        self.publish()
+
     def _reset(self):
         """Execute reset on all devices"""
         for name,dev in Server.DevDict.items():
@@ -914,34 +2461,98 @@ class Server():
     Dbg = 0
     DevDict = {}
     Perf= {'Sends': 0, 'MBytes': 0., 'Seconds': 0., 'Retransmits': 0,
-        'ItemsLost': 0, 'Dropped':0}
+        'ItemsLost': 0, 'Dropped':0, 'SyscallsSaved':0, 'QueueDrops':0,
+        'Evictions':0, 'Probes':0, 'RequestDrops':0}
     Timestamp = time.time()
+    Threaded = True# periodic tasks are served by threads, see AsyncServer
+    LossRate = 0.# retransmit requests per reply during last heartbeat interval
     #,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,,
     #``````````````Instantiation`````````````````````````````````````````````
     def __init__(self, devices=[], interface='', port=defaultServerPort
     , serverPars=True):
         printi(f'Server.Dbg: {Server.Dbg}')
+        self.worker = None# index of the worker process
+        if UDP and Workers > 0 and BulkPort:
+            # the kernel would pick a worker for the datagrams to the bulk
+            # port independently of the control port
+            raise ValueError('LS: BulkPort is not supported with Workers')
+        if UDP and Workers > 0 and UnixPath:
+            # only one process could be bound to the path
+            raise ValueError('LS: UnixPath is not supported with Workers')
+        if UDP and Workers > 0 and not self.Threaded:
+            raise ValueError('LS: Workers are not supported with AsyncServer')
+        if UDP and Workers > 0:
+            # fork before any thread of the server is started
+            self.worker = self._fork_workers()
+        acquisition = bool(_WorkerLinks)
         # create Device 'server'
         if serverPars:
-            self.DevDict['server'] = ServerDev('server')
+            self.DevDict['server'] = ServerDev('server', self.Threaded)
         
         for dev in devices:
             self.DevDict[dev.name] = dev
 
         self.host = ip_address(interface)
         self.port = port
-        s = _myUDPServer if UDP else SocketServer.TCPServer
-        s.allow_reuse_address = True
-        self.socketServer = s((self.host, self.port))#, _LDO_Handler)#, False)
+        if acquisition:
+            # the port is served by the workers
+            self.socketServer = None
+        else:
+            s = _myUDPServer if UDP else _TCPServer
+            s.allow_reuse_address = True
+            self.socketServer = s((self.host, self.port))#, _LDO_Handler)#, False)
+            if UDP and serverPars:
+                self.DevDict['server']._set_buffers()
+        self.tcpServer = None# TCP connections, served along with UDP
+        if UDP and TCPPort and not acquisition:
+            self.tcpServer = _TCPServer((self.host, TCPPort))
         #self.server.allow_reuse_address = True
         #if UDP:
         #    self.server.server_bind()
         #self.server.server_activate()
         printi(f'Server for {self.host}:{self.port} is serving devices:')
         print(f'{list(self.DevDict.keys())}')
-        if UDP:#TODO: move it to the loop
-            threadDevsPoll = threading.Thread(target=self._devsPoll, daemon=True)
-            threadDevsPoll.start()
+        if UDP and self.Threaded:#TODO: move it to the loop
+            if self.worker is None:
+                threadDevsPoll = threading.Thread(target=self._devsPoll, daemon=True)
+                threadDevsPoll.start()
+            else:
+                thread = threading.Thread(target=_receive_publications,
+                  args=(_AcquisitionLink,), daemon=True)
+                thread.start()
+            if self.socketServer is not None:
+                thread = threading.Thread(target=self.socketServer._service_loop,
+                  daemon=True)
+                thread.start()
+
+    if UDP:
+      def _fork_workers(self):
+        """Fork Workers processes. Returns the index of the worker in the 
+        worker process and None in the acquisition process"""
+        global _AcquisitionLink, _Forwarders
+        links = [_WorkerLink() for i in range(Workers)]
+        for i,link in enumerate(links):
+            pid = os.fork()
+            if pid == 0:
+                # keep only the worker ends of its own link
+                for other in links:
+                    other.close('pubSender', 'responder', 'reportReceiver')
+                    if other is not link:
+                        other.close('pubReceiver', 'requester',
+                          'reportSender')
+                _AcquisitionLink = link
+                return i
+            link.pid = pid
+        _Forwarders = _KeyedPool('forwarder', Workers, OutboundQueueSize)
+        for link in links:
+            link.close('pubReceiver', 'requester', 'reportSender')
+            _WorkerLinks.append(link)
+            for target in (_serve_worker_requests, _receive_reports):
+                thread = threading.Thread(target=target, args=(link,),
+                  daemon=True)
+                thread.start()
+        printi(f'Port is served by worker processes: {[l.pid for l in links]}')
+        return None
 
     if UDP:
       def _devsPoll(self):
@@ -969,22 +2580,92 @@ class Server():
     def loop(self):
         """Processing of the network requests, should be called after instantiation"""
         Device.server = self.DevDict['server']
+        if UDP and self.socketServer is None:
+            self._wait_workers()
+            return
         printi(__version__+'. Waiting for %s messages at %s'%(('TCP','UDP')[UDP],self.host+';'+str(self.port)))
-        serviceActionTime = time.time()
-        if UDP: 
-            pollingInterval = AckInterval
-            sock = self.socketServer.sock
-        else:
-            pollingInterval = 0.5
+        if UDP:
+            bulkSock = self.socketServer.bulkSock
+            if bulkSock is not None:
+                printi(f'Publications are sent from port {BulkPort}')
+                thread = threading.Thread(target=self._serve, args=(bulkSock,),
+                  daemon=True, name='bulk')
+                thread.start()
+            if self.tcpServer is not None:
+                printi(f'TCP connections are served on port {TCPPort}')
+                thread = threading.Thread(target=self.tcpServer.serve,
+                  daemon=True, name='tcp')
+                thread.start()
+            unixSock = self.socketServer.unixSock
+            if unixSock is not None:
+                printi(f'Local clients are served on {UnixPath}')
+                thread = threading.Thread(target=self._serve, args=(unixSock,),
+                  daemon=True, name='unix')
+                thread.start()
+            self._serve(self.socketServer.sock)
+            return
+        try:
+            self.socketServer.serve()
+        except KeyboardInterrupt:
+            printe('KeyboardInterrupt in server loop')
+            Device.EventExit.set()
+
+    if UDP:
+      def _wait_workers(self):
+        """Acquisition process: run until exit, then stop the workers"""
+        printi(__version__+f'. Devices are served by {Workers} workers')
+        try:
+            while not Device.EventExit.wait(1):
+                pass
+        except KeyboardInterrupt:
+            printe('KeyboardInterrupt in server loop')
+            Device.EventExit.set()
+        for link in _WorkerLinks:
+            try:
+                os.kill(link.pid, signal.SIGTERM)
+                os.waitpid(link.pid, 0)
+            except OSError:
+                pass
+
+      def _serve(self, sock):
+        """Receive and handle datagrams from the UDP socket"""
+        # the received datagrams are placed into the same buffer,
+        # handle_socketData() gets its view, it should not keep it
+        buf = bytearray(MaxDatagramSize)
+        view = memoryview(buf)
+        # duplicate of the socket for draining the pending datagrams
+        # without waiting
+        drain = sock.dup()
+        drain.setblocking(False)
+        rxqOvfl = RxqOvfl and sock.family == socket.AF_INET
+        if rxqOvfl:
+            # the kernel attaches its drop counter to received datagrams
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                ancSize = socket.CMSG_SPACE(4)
+            except OSError as e:
+                printw(f'SO_RXQ_OVFL is not supported: {e}')
+                rxqOvfl = False
+        def receive(s):
+            if not rxqOvfl:
+                return s.recvfrom_into(buf)
+            nbytes, ancdata, _, address = s.recvmsg_into([buf], ancSize)
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL:
+                    _myUDPServer.rxqDrops[sock] = int.from_bytes(data[:4],
+                      sys.byteorder)
+            return nbytes, address
         while not Device.EventExit.is_set():
             try:
-                if UDP:
-                    data, address = sock.recvfrom(4096)
-                else:
-                    address = '?',0
-                    data =  sock.recv(4096)
-                printvv(f'data[{len(data)}], from: {address}')
-                handle_socketData(data, (sock, address))
+                nbytes, address = receive(sock)
+                # handle all pending datagrams before waiting again
+                while True:
+                    printvv(f'data[{nbytes}], from: {address}')
+                    handle_socketData(view[:nbytes], (sock, address))
+                    try:
+                        nbytes, address = receive(drain)
+                    except BlockingIOError:
+                        break
             except socket.timeout:
                 printvv(f'No requests')
             except KeyboardInterrupt:
@@ -995,12 +2676,98 @@ class Server():
                 print(f'Exception in the loop: {e}: {traceback.format_exc()}')
                 continue
 
-            #self.server.serve_forever(poll_interval=pollingInterval)
-            ctime = time.time()
-            if ctime - serviceActionTime > pollingInterval:
-                #printi(f'>service_action. {printTime()}')
-                serviceActionTime = ctime
-                self.socketServer.service_actions()
+if UDP:
+  class _DatagramProtocol(asyncio.DatagramProtocol):
+    """Passes the received datagrams to handle_socketData(). The replies are
+    sent through the server socket, not through the transport"""
+    def __init__(self, sock):
+        self.sock = sock
+
+    def datagram_received(self, data, address):
+        try:
+            handle_socketData(data, (self.sock, address))
+        except Exception as e:
+            print(f'Exception in the loop: {e}: {traceback.format_exc()}')
+
+  class AsyncServer(Server):
+    """Server, which runs the request handling, device polling, heartbeat
+    and retransmission timer on one asyncio event loop instead of threads.
+    The poll() method of a device could be a coroutine, it is awaited. 
+    Devices could schedule their own coroutines on AsyncServer.EventLoop.
+    The heartbeat and the service actions take publish_Lock, they are run
+    in the default executor. The publications are sent by SenderThreads and
+    the requests are handled by RequestThreads, set them to 0 to do it on
+    the event loop. Workers are not supported."""
+    Threaded = False
+    EventLoop = None
+
+    def loop(self):
+        """Run the event loop, should be called after instantiation"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            printe('KeyboardInterrupt in server loop')
+            Device.EventExit.set()
+
+    async def serve(self):
+        Device.server = self.DevDict['server']
+        AsyncServer.EventLoop = asyncio.get_running_loop()
+        printi(__version__+'. Waiting for UDP messages at %s'%(self.host+';'+str(self.port)))
+        socks = [self.socketServer.sock]
+        if self.socketServer.bulkSock is not None:
+            printi(f'Publications are sent from port {BulkPort}')
+            socks.append(self.socketServer.bulkSock)
+        if self.socketServer.unixSock is not None:
+            printi(f'Local clients are served on {UnixPath}')
+            socks.append(self.socketServer.unixSock)
+        transports = []
+        for sock in socks:
+            # the duplicate is non-blocking, the sending socket keeps its timeout
+            transport,_ = await AsyncServer.EventLoop.create_datagram_endpoint(
+              lambda sock=sock: _DatagramProtocol(sock), sock=sock.dup())
+            transports.append(transport)
+        if self.tcpServer is not None:
+            printi(f'TCP connections are served on port {TCPPort}')
+            thread = threading.Thread(target=self.tcpServer.serve,
+              daemon=True, name='tcp')
+            thread.start()
+        tasks = [asyncio.ensure_future(coro) for coro in (self._apoll(),
+          self._aheartbeat(), self._aservice())]
+        while not Device.EventExit.is_set():
+            await asyncio.sleep(ServiceInterval)
+        for task in tasks:
+            task.cancel()
+        for transport in transports:
+            transport.close()
+
+    async def _apoll(self):
+        """Call poll() of all devices except server with devsPollingInterval"""
+        await asyncio.sleep(.5)# Give time for devices to settle
+        while not Device.EventExit.is_set():
+            lasttime = time.time()
+            Server.Timestamp = lasttime
+            for name,dev in self.DevDict.items():
+                if name != 'server':
+                    r = dev.poll()
+                    if asyncio.iscoroutine(r):
+                        await r
+            interval = Device.server.PV['devsPollingInterval'].value[0]
+            await asyncio.sleep(max(0., interval - (time.time() - lasttime)))
+
+    async def _aheartbeat(self):
+        while not Device.EventExit.is_set():
+            await asyncio.sleep(10)
+            await AsyncServer.EventLoop.run_in_executor(None,
+              Device.server.beat)
+
+    async def _aservice(self):
+        while not Device.EventExit.is_set():
+            await asyncio.sleep(ServiceInterval)
+            try:
+                await AsyncServer.EventLoop.run_in_executor(None,
+                  self.socketServer.service_actions)
+            except Exception as e:
+                printe(f'in service_actions: {e}: {traceback.format_exc()}')
 
 def isHostPortSubscribed(hostPort):
     """For testing purposes"""
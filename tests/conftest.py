@@ -0,0 +1,79 @@
+"""Server with test devices on loopback, shared by the tests"""
+import socket, struct, threading, time
+import cbor2
+import pytest
+from liteserver import liteserver
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Port = 9751
+TCPPort = 9752
+ImageSize = 300000# the reply takes 5 chunks
+SeqHeader = struct.Struct('>IIIHH')
+
+class Cam(liteserver.Device):
+    """Test device, the image is provided if numpy is installed"""
+    def __init__(self, name):
+        pars = {'cycle': liteserver.LDO('R', 'cycle', [0]),
+          'reads': liteserver.LDO('R', 'Number of reads', [0],
+            getter=self._count)}
+        if np is not None:
+            pars['image'] = liteserver.LDO('R', 'image',
+              np.arange(ImageSize, dtype='uint8'))
+        super().__init__(name, pars)
+
+    def _count(self):
+        self.PV['reads'].value[0] += 1
+
+class Client():
+    """UDP client of the test server"""
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1<<23)
+        self.sock.settimeout(2)
+
+    def request(self, cmdArgs, **items):
+        msg = {'cmd':cmdArgs, 'pid':1, 'username':'test'}
+        msg.update(items)
+        self.sock.sendto(cbor2.dumps(msg), ('127.0.0.1', Port))
+
+    def receive_chunk(self):
+        """Returns offset, payload and address of a chunk in legacy mode"""
+        data, address = self.sock.recvfrom(70000)
+        return int.from_bytes(data[:4], 'big'), data[4:], address
+
+    def receive(self):
+        """Receive and acknowledge a reply in legacy mode"""
+        chunks = {}
+        while True:
+            offset, chunk, address = self.receive_chunk()
+            chunks[offset] = chunk
+            if offset == 0:
+                break
+        self.sock.sendto(b'ACK', address)
+        return cbor2.loads(b''.join(chunks[k] for k in sorted(chunks)))
+
+    def receive_seq(self):
+        """Returns SeqHeader fields, payload and address of a chunk in
+        sequenced mode"""
+        data, address = self.sock.recvfrom(70000)
+        return SeqHeader.unpack_from(data), data[SeqHeader.size:], address
+
+    def close(self):
+        self.sock.close()
+
+@pytest.fixture(scope='session')
+def server():
+    liteserver.TCPPort = TCPPort
+    server = liteserver.Server([Cam('cam')], interface='localhost', port=Port)
+    threading.Thread(target=server.loop, daemon=True).start()
+    time.sleep(0.5)
+    return server
+
+@pytest.fixture
+def client():
+    client = Client()
+    yield client
+    client.close()
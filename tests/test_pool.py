@@ -0,0 +1,24 @@
+"""Tests of the keyed thread pool"""
+import threading
+from liteserver import liteserver
+
+def test_dropped_jobs_are_reported():
+    dropped = []
+    pool = liteserver._KeyedPool('test', 0, 2, lambda *args: dropped.append(args))
+    for i in range(4):
+        pool.submit('client', print, i)
+    pool.submit('other', print, 9)
+    assert dropped == [(0,), (1,)]
+
+def test_jobs_of_a_key_are_ordered():
+    done = []
+    finished = threading.Event()
+    def job(i):
+        done.append(i)
+        if i == 9:
+            finished.set()
+    pool = liteserver._KeyedPool('test', 3, 10)
+    for i in range(10):
+        pool.submit('client', job, i)
+    assert finished.wait(2)
+    assert done == list(range(10))
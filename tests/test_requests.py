@@ -0,0 +1,32 @@
+"""Loopback tests of the reply cache and batch requests"""
+
+GetReads = ['get', [['localhost:cam', [['reads']]]]]
+
+def reads(reply):
+    return reply['localhost:cam:reads']['value'][0]
+
+def test_duplicate_is_replied_from_cache(server, client):
+    client.request(GetReads, rid=1)
+    first = client.receive()
+    client.request(GetReads, rid=1)
+    assert client.receive() == first
+    client.request(GetReads, rid=2)
+    assert reads(client.receive()) == reads(first) + 1
+
+def test_reused_rid(server, client):
+    client.request(GetReads, rid=3)
+    client.receive()
+    client.request(['info', [['localhost:cam', [['reads']]]]], rid=3)
+    assert 'desc' in client.receive()['reads']
+
+def test_batch_with_failures(server, client):
+    client.request(['batch', [['get', [['localhost:cam', [['cycle']]]]],
+      [5], 7, [], ['get', [['localhost:nodev', [['cycle']]]]],
+      ['subscribe', [['localhost:cam', [['cycle']]]]],
+      ['info', [['localhost:cam', [['cycle']]]]]]])
+    reply = client.receive()
+    assert len(reply) == 7
+    assert 'localhost:cam:cycle' in reply[0]
+    for r in reply[1:6]:
+        assert r.startswith('ERR.LS')
+    assert 'desc' in reply[6]['cycle']
@@ -0,0 +1,84 @@
+"""Loopback tests of the retransmission of lost chunks"""
+import struct
+import cbor2
+import pytest
+np = pytest.importorskip('numpy')
+from conftest import ImageSize
+from liteserver import liteserver
+
+Get = ['get', [['localhost:cam', [['image']]]]]
+Image = bytes(np.arange(ImageSize, dtype='uint8'))
+
+def image_value(data):
+    return cbor2.loads(data)['localhost:cam:image']['value']
+
+def test_legacy_retransmit(server, client):
+    client.request(Get)
+    chunks = {}
+    while True:
+        offset, chunk, address = client.receive_chunk()
+        chunks[offset] = chunk
+        if offset == 0:
+            break
+    lost = sorted(chunks)[1]
+    size = len(chunks.pop(lost))
+    client.request(['retransmit', [lost, size]])
+    offset, chunk, address = client.receive_chunk()
+    assert offset == lost
+    chunks[lost] = chunk
+    client.sock.sendto(b'ACK', address)
+    reply = b''.join(chunks[k] for k in sorted(chunks))
+    assert image_value(reply) == Image
+
+def test_sequenced_retransmit(server, client):
+    client.request(Get, window=4)
+    chunks = {}
+    while len(chunks) < 5:
+        (seq, offset, length, chunkSize, flags), chunk, address\
+          = client.receive_seq()
+        chunks[offset] = chunk
+    # lose the first chunk, it is sent last
+    del chunks[0]
+    client.request(['retransmit', {'chunks':[0], 'seq':seq}])
+    (rseq, offset, *_), chunk, address = client.receive_seq()
+    assert (rseq, offset) == (seq, 0)
+    chunks[0] = chunk
+    client.sock.sendto(b'ACK' + struct.pack('>II', seq, seq), address)
+    reply = b''.join(chunks[k] for k in sorted(chunks))
+    assert len(reply) == length
+    assert image_value(reply) == Image
+
+def xor(*chunks):
+    """XOR of chunks, shorter chunk is padded with zeros"""
+    size = max(len(c) for c in chunks)
+    r = 0
+    for c in chunks:
+        r ^= int.from_bytes(c.ljust(size, b'\0'), 'big')
+    return r.to_bytes(size, 'big')
+
+def test_fec_rebuilds_lost_chunks(server, client, monkeypatch):
+    monkeypatch.setattr(liteserver, 'ParityChunks', 2)
+    client.request(Get, window=4, fec=True)
+    chunks, parities = {}, {}
+    while len(chunks) + len(parities) < 7:
+        (seq, offset, length, chunkSize, flags), chunk, address\
+          = client.receive_seq()
+        if flags & liteserver.FlagParity:
+            assert flags >> 8 == 2
+            assert len(chunk) == chunkSize
+            parities[offset] = chunk
+        else:
+            chunks[offset//chunkSize] = chunk
+    assert sorted(parities) == [0, 1]
+    assert len(chunks) == 5 and len(chunks[4]) < chunkSize
+    client.sock.sendto(b'ACK' + struct.pack('>II', seq, seq), address)
+    # lose a full chunk and the short last chunk, rebuild them from parity
+    # j, which covers the chunks with index % 2 == j
+    for lost in (1, 4):
+        del chunks[lost]
+        size = min(chunkSize, length - lost*chunkSize)
+        others = [c for i,c in chunks.items() if i%2 == lost%2]
+        chunks[lost] = xor(parities[lost%2], *others)[:size]
+    reply = b''.join(chunks[k] for k in sorted(chunks))
+    assert len(reply) == length
+    assert image_value(reply) == Image
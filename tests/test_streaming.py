@@ -0,0 +1,49 @@
+"""Tests of the encoding of replies with streamed numpy values"""
+import pytest
+np = pytest.importorskip('numpy')
+from liteserver import liteserver
+
+@pytest.fixture
+def streaming(monkeypatch):
+    monkeypatch.setattr(liteserver, 'StreamMinSize', 100)
+
+def reply_data(**values):
+    return {f'dev:{name}': {'value': value, 'numpy': (value.shape,
+      str(value.dtype)), 'timestamp': 1.}
+      for name, value in values.items()}
+
+def reference(replyData):
+    """Reply encoded with the values converted to bytes"""
+    return liteserver.encoderDump({key: dict(parDict,
+      value=parDict['value'].tobytes()) for key, parDict in replyData.items()})
+
+def test_placeholders_of_several_arrays(streaming):
+    data = reply_data(a=np.arange(1000, dtype='uint16'), small=np.arange(3),
+      b=np.arange(300, dtype='float64').reshape(10,30),
+      ro=np.frombuffer(bytes(range(200)), dtype='uint8'))
+    expected = reference(data)
+    reply = liteserver._encode_segments(data)
+    # skeleton pieces, bytes headers and arrays of a, b and ro
+    assert len(reply.segments) == 10
+    assert len(reply) == len(expected)
+    assert reply.tobytes() == expected
+
+def test_slices_across_segments(streaming):
+    data = reply_data(a=np.arange(200, dtype='uint8'),
+      b=np.arange(200, 400, dtype='uint16'))
+    expected = reference(data)
+    reply = liteserver._encode_segments(data)
+    size = len(expected)
+    for start in range(0, size, 7):
+        for length in (1, 13, 150, 500, size):
+            assert bytes(reply[start:start + length])\
+              == expected[start:start + length]
+
+def test_dtype_without_buffer(streaming):
+    times = np.arange(100).astype('datetime64[s]')
+    objects = np.array([1, 'a']*100, dtype=object)
+    data = reply_data(t=times, o=objects)
+    reply = liteserver._encode_segments(data)
+    assert len(reply.segments) == 1
+    assert data['dev:t']['value'] == times.tobytes()
+    assert isinstance(data['dev:o']['value'], bytes)
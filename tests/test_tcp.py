@@ -0,0 +1,70 @@
+"""Loopback tests of the TCP transport"""
+import socket, time
+import cbor2
+from liteserver import liteserver
+from conftest import TCPPort
+
+FramePrefix = liteserver.FramePrefix
+
+def frame(cmdArgs):
+    data = cbor2.dumps({'cmd':cmdArgs, 'pid':1, 'username':'test'})
+    return FramePrefix.pack(len(data)) + data
+
+def receive_frame(conn):
+    def read(n):
+        data = b''
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            assert chunk, 'connection closed'
+            data += chunk
+        return data
+    size = FramePrefix.unpack(read(FramePrefix.size))[0]
+    return cbor2.loads(read(size))
+
+def connect():
+    conn = socket.create_connection(('127.0.0.1', TCPPort))
+    conn.settimeout(2)
+    return conn
+
+def test_frames_split_and_joined(server):
+    conn = connect()
+    data = frame(['get', [['localhost:cam', [['cycle']]]]])*2
+    # the first frame is split, the second follows it in the same segment
+    conn.sendall(data[:3])
+    time.sleep(0.1)
+    conn.sendall(data[3:])
+    for i in range(2):
+        assert 'localhost:cam:cycle' in receive_frame(conn)
+    conn.close()
+
+def test_close_cancels_subscriptions(server):
+    conn = connect()
+    address = conn.getsockname()
+    conn.sendall(frame(['subscribe', [['localhost:cam', [['cycle']]]]]))
+    dev = liteserver.Server.DevDict['cam']
+    for i in range(20):
+        if address in dev.subscribers:
+            break
+        time.sleep(0.05)
+    assert address in dev.subscribers
+    conn.close()
+    for i in range(20):
+        if address not in dev.subscribers:
+            break
+        time.sleep(0.05)
+    assert address not in dev.subscribers
+
+def test_oversized_frame_closes_connection(server):
+    conn = connect()
+    conn.sendall(FramePrefix.pack(liteserver.MaxFrameSize + 1) + b'x')
+    assert conn.recv(100) == b''
+    conn.close()
+
+def test_send_without_sendmsg():
+    class Conn():# socket without sendmsg, as on Windows
+        data = b''
+        def sendall(self, data):
+            self.data += data
+    conn = Conn()
+    liteserver._send_TCP(b'reply', conn)
+    assert conn.data == FramePrefix.pack(5) + b'reply'